@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for card handling, hand evaluation and full game rounds.
+
+Each benchmark is timed over several repeats; results are written as JSON
+with ops/sec and per-op latency percentiles. Given a saved baseline (an
+earlier results file), the run fails if any benchmark's ops/sec dropped by
+more than the threshold.
+
+    python benchmark.py --output bench.json
+    python benchmark.py --baseline bench.json --threshold 0.1
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from statistics import median, quantiles
+
+import simulation
+from utils import Card, Deck, Hand, Player, PokerGame, VALUES, SUITS, \
+    get_checkrep_policy
+
+DEFAULT_REPEATS = 7
+DEFAULT_MIN_TIME = 0.2                  # Seconds per repeat
+DEFAULT_THRESHOLD = 0.1                 # Allowed ops/sec drop vs baseline
+SEED = 0
+
+
+def _dealt_hands(num_hands):
+    deck = Deck()
+    hands = []
+    for i in range(num_hands):
+        if deck.get_num_cards() < 5:
+            deck.reset()
+        deck.shuffle()
+        hands.append(Hand(deck.draw_codes(5)))
+    return hands
+
+
+def _game(num_players, cost=20, bal=100):
+    return PokerGame([Player(bal, f'Player {i}') for i in range(num_players)],
+                     cost)
+
+
+def _dealt_game(num_players):
+    game = _game(num_players)
+    for i in range(2):
+        for player in game.players:
+            player.add_card(game.deck.draw_codes(1)[0])
+    game.table = tuple(game.deck.draw_codes(5))
+    return game
+
+
+def bench_card_construction():
+    names = [(suit, val) for suit in SUITS for val in VALUES]
+    return lambda: [Card(suit, val) for suit, val in names], len(names)
+
+
+def bench_deck_shuffle_draw():
+    deck = Deck()
+
+    def op():
+        deck.reset()
+        deck.shuffle()
+        deck.draw_codes(33)                 # A 14-player round
+    return op, 1
+
+
+def bench_hand_get_best_hand():
+    hands = [h.get_codes() for h in _dealt_hands(100)]
+
+    def op():
+        for codes in hands:
+            Hand(codes).get_best_hand()     # Fresh hands, so nothing cached
+    return op, len(hands)
+
+
+def bench_hand_comparison():
+    hands = _dealt_hands(101)
+    pairs = list(zip(hands, hands[1:]))
+    return lambda: [a > b for a, b in pairs], len(pairs)
+
+
+def bench_game_get_best_hand():
+    game = _dealt_game(14)
+    return lambda: [game.get_best_hand(p) for p in game.players], \
+        len(game.players)
+
+
+def bench_game_get_winner():
+    game = _dealt_game(14)
+    return game.get_winner, 1
+
+
+def bench_play_round(num_players):
+    def setup():
+        game = _game(num_players, bal=10 ** 9)
+
+        def op():
+            game.play_round()
+        return op, 1
+    return setup
+
+
+def bench_iterate_game(num_players, num_rounds=50):
+    def setup():
+        def op():
+            _game(num_players).iterate_game(num_rounds)
+        return op, 1
+    return setup
+
+
+def bench_simulate_hand_distr():
+    seeds = iter(range(10 ** 9))
+    return lambda: simulation.simulate_hand_distr(10 ** 4, seed=next(seeds)), \
+        10 ** 4 * simulation.HANDS_PER_DECK
+
+
+BENCHMARKS = {
+    'micro/card_construction': bench_card_construction,
+    'micro/deck_shuffle_draw': bench_deck_shuffle_draw,
+    'micro/hand_get_best_hand': bench_hand_get_best_hand,
+    'micro/hand_comparison': bench_hand_comparison,
+    'micro/game_get_best_hand': bench_game_get_best_hand,
+    'micro/game_get_winner': bench_game_get_winner,
+    'macro/simulate_hand_distr': bench_simulate_hand_distr,
+}
+for _n in (3, 6, 14):
+    BENCHMARKS[f'macro/play_round_{_n}p'] = bench_play_round(_n)
+    BENCHMARKS[f'macro/iterate_game_{_n}p'] = bench_iterate_game(_n)
+
+
+def run_benchmark(setup, repeats=DEFAULT_REPEATS, min_time=DEFAULT_MIN_TIME):
+    """
+    Times the op returned by `setup()` (along with how many operations one
+    call performs). Each repeat calls it until `min_time` has passed; the
+    per-op time of every call is one sample.
+    """
+    random.seed(SEED)
+    op, ops_per_call = setup()
+    op()                                    # Warm up
+    samples, total_ops, total_time = [], 0, 0.0
+    for i in range(repeats):
+        start = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < min_time:
+            t0 = time.perf_counter()
+            op()
+            t1 = time.perf_counter()
+            samples.append((t1 - t0) / ops_per_call)
+            total_ops += ops_per_call
+            elapsed = t1 - start
+        total_time += elapsed
+
+    if len(samples) > 1:
+        cuts = quantiles(samples, n=100, method='inclusive')
+        p50, p90, p99 = cuts[49], cuts[89], cuts[98]
+    else:
+        p50 = p90 = p99 = samples[0]
+    return {'ops_per_sec': total_ops / total_time,
+            'median_ops_per_sec': 1.0 / median(samples),
+            'p50_us': p50 * 1e6, 'p90_us': p90 * 1e6, 'p99_us': p99 * 1e6,
+            'calls': len(samples), 'ops': total_ops}
+
+
+def run_all(names=None, repeats=DEFAULT_REPEATS, min_time=DEFAULT_MIN_TIME):
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if names and not any(n in name for n in names):
+            continue
+        results[name] = run_benchmark(setup, repeats, min_time)
+        print(f'{name:32s} {results[name]["ops_per_sec"]:14.1f} ops/s  '
+              f'p50 {results[name]["p50_us"]:10.2f} us', file=sys.stderr)
+    return {'meta': {'python': platform.python_version(),
+                     'machine': platform.machine(),
+                     'checkrep_policy': get_checkrep_policy(),
+                     'repeats': repeats, 'min_time': min_time},
+            'results': results}
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Returns (name, baseline ops/sec, current ops/sec, change) for every
+    benchmark whose ops/sec fell by more than `threshold` (a fraction)."""
+    regressions = []
+    for name, result in results['results'].items():
+        if name not in baseline['results']:
+            continue
+        old = baseline['results'][name]['ops_per_sec']
+        new = result['ops_per_sec']
+        change = (new - old) / old
+        if change < -threshold:
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--output', help='write JSON results to this file')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed fractional ops/sec drop (default 0.1)')
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS)
+    parser.add_argument('--min-time', type=float, default=DEFAULT_MIN_TIME)
+    parser.add_argument('names', nargs='*',
+                        help='only run benchmarks whose name contains one')
+    args = parser.parse_args(argv)
+
+    results = run_all(args.names, args.repeats, args.min_time)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, old, new, change in regressions:
+            print(f'REGRESSION {name}: {old:.1f} -> {new:.1f} ops/s '
+                  f'({change:+.1%})', file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
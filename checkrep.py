@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Invariant checking policy for the _checkrep methods of utils and the modules
+built on it. Decorating a _checkrep with @checkrep_policy makes it verify its
+invariants on every call, on a sample of calls, or never, as set per class or
+module-wide with set_checkrep_policy or the POKER_CHECKREP environment
+variable. All of these names are re-exported by utils.
+"""
+
+import os
+from functools import wraps
+
+# Invariant checking levels for the _checkrep methods (see set_checkrep_policy)
+CHECKREP_OFF = 'off'
+CHECKREP_SAMPLED = 'sampled'
+CHECKREP_FULL = 'full'
+CHECKREP_LEVELS = (CHECKREP_OFF, CHECKREP_SAMPLED, CHECKREP_FULL)
+CHECKREP_ENV_VAR = 'POKER_CHECKREP'
+DEFAULT_SAMPLE_RATE = 100
+
+
+class _CheckrepPolicy():
+    """Invariant checking policy of a single class; `count` tracks calls
+    since the last sampled check and `calls` all calls ever made."""
+
+    __slots__ = ('level', 'sample_rate', 'count', 'calls')
+
+    def __init__(self, level=CHECKREP_FULL, sample_rate=DEFAULT_SAMPLE_RATE):
+        self.level = level
+        self.sample_rate = sample_rate
+        self.count = 0
+        self.calls = 0
+
+
+_checkrep_policies = {}     # Class -> _CheckrepPolicy
+_checkrep_overrides = {}    # Class or class name -> (level, sample_rate)
+_checkrep_default = (CHECKREP_FULL, DEFAULT_SAMPLE_RATE)
+
+
+def _get_override(owner):
+    """(level, sample_rate) of class `owner`: its own override, else the
+    override for its name, else the module-wide default."""
+    setting = _checkrep_overrides.get(owner)
+    if setting is None:
+        setting = _checkrep_overrides.get(owner.__name__, _checkrep_default)
+    return setting
+
+
+def _apply_checkrep_policies():
+    for owner, policy in _checkrep_policies.items():
+        policy.level, policy.sample_rate = _get_override(owner)
+        policy.count = 0
+
+
+def set_checkrep_policy(level, sample_rate=None, cls=None):
+    """
+    Sets how often _checkrep invariants are verified:
+        'full'    on every call (default)
+        'sampled' on 1 in `sample_rate` calls
+        'off'     never
+
+    Applies to every class unless `cls` is given, in which case it overrides
+    the module-wide policy for that class only, or for every class of that
+    name if `cls` is a string. The override is kept for classes whose
+    _checkrep is not registered yet and applied when it is.
+    """
+    if level not in CHECKREP_LEVELS:
+        raise ValueError(f"Unknown checkrep level: {level}")
+    if sample_rate is None:
+        sample_rate = DEFAULT_SAMPLE_RATE
+    if sample_rate < 1:
+        raise ValueError("Sample rate must be at least 1")
+
+    global _checkrep_default
+    if cls is None:
+        _checkrep_default = (level, sample_rate)
+        _checkrep_overrides.clear()
+    else:
+        _checkrep_overrides[cls] = (level, sample_rate)
+    _apply_checkrep_policies()
+
+
+def get_checkrep_policy(cls=None):
+    """Returns the (level, sample_rate) policy of `cls` (a class or class
+    name), or the module-wide default if `cls` is None."""
+    if cls is None:
+        return _checkrep_default
+    if isinstance(cls, str):
+        owners = [o for o in _checkrep_policies if o.__name__ == cls]
+        if not owners:
+            return _checkrep_overrides.get(cls, _checkrep_default)
+        cls = owners[0]
+    policy = _checkrep_policies.get(cls)
+    if policy is None:
+        return _get_override(cls)
+    return policy.level, policy.sample_rate
+
+
+def load_checkrep_policy(spec=None):
+    """
+    Sets the checkrep policy from a spec string, by default read from the
+    POKER_CHECKREP environment variable. The spec is a comma-separated list
+    of `level[:rate]` entries, optionally prefixed with `ClassName=`, e.g.
+        POKER_CHECKREP="sampled:1000,PokerGame=off"
+    """
+    if spec is None:
+        spec = os.environ.get(CHECKREP_ENV_VAR, '')
+    overrides = []
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, setting = entry.rpartition('=')
+        level, _, rate = setting.partition(':')
+        rate = int(rate) if rate else None
+        if name:
+            overrides.append((level, rate, name))
+        else:
+            set_checkrep_policy(level, rate)
+    for level, rate, name in overrides:
+        set_checkrep_policy(level, rate, name)
+
+
+class checkrep_policy():
+    """
+    Decorator for _checkrep methods applying the policy of the class that
+    defines them. The policy is registered when that class is created, and
+    the method is then replaced by a plain function checking it.
+    """
+
+    def __init__(self, checkrep):
+        self.checkrep = checkrep
+
+    def __set_name__(self, owner, name):
+        # Classes registered after the policy was set start from it too
+        policy = _CheckrepPolicy(*_get_override(owner))
+        _checkrep_policies[owner] = policy
+        checkrep = self.checkrep
+
+        @wraps(checkrep)
+        def checked(self):
+            policy.calls += 1
+            level = policy.level
+            if level == CHECKREP_FULL:
+                checkrep(self)
+            elif level == CHECKREP_SAMPLED:
+                policy.count += 1
+                if policy.count >= policy.sample_rate:
+                    policy.count = 0
+                    checkrep(self)
+        setattr(owner, name, checked)
+
+
+def get_checkrep_calls(cls=None):
+    """Number of _checkrep calls so far (whether or not the policy ran the
+    check), for class `cls` or summed over all classes."""
+    if cls is None:
+        return sum(p.calls for p in _checkrep_policies.values())
+    if isinstance(cls, str):
+        return sum(p.calls for owner, p in _checkrep_policies.items()
+                   if owner.__name__ == cls)
+    policy = _checkrep_policies.get(cls)
+    return 0 if policy is None else policy.calls
+
+
+load_checkrep_policy()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Hold'em equity calculator: the probability that a hero's hole cards win, tie
+or lose at showdown on a (possibly partial) board against random opponent
+hands, estimated by Monte Carlo with early stopping.
+
+Also provides EquityStrategy, Player strategy 'equity', which bets on equity
+estimates computed within a per-decision time budget.
+"""
+
+import random
+import time
+from statistics import NormalDist
+
+import numpy as np
+
+from evaluator import evaluate
+from strategy import Strategy, Decision, NO_CARD, FOLD, CHECK, RAISE, ALL_IN
+from utils import Card, Deck, STARTING_NUM_CARDS, \
+    MAX_CARDS_ON_TABLE, MAX_NUM_PLAYERS, to_codes, checkrep_policy
+
+DEFAULT_PRECISION = 0.01
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_SAMPLES = 10 ** 6
+DEFAULT_TIME_BUDGET = 0.002             # Seconds per decision
+DEFAULT_DECISION_SAMPLES = 2000         # Sample cap per decision
+MIN_STEP_SAMPLES = 8                    # Samples between deadline checks
+MAX_STEP_SAMPLES = 256
+
+
+class EquityResult():
+    """
+    Outcome of an equity estimate.
+        win, tie, lose (float): fraction of samples hero won outright, split,
+                                or lost
+        equity (float): expected share of the pot, counting a k-way split
+                        as 1/k of a win
+        ci (tuple): (low, high) confidence interval on equity
+        samples (int): number of showdowns sampled
+    """
+
+    def __init__(self, win, tie, lose, equity, ci, samples):
+        self.win = win
+        self.tie = tie
+        self.lose = lose
+        self.equity = equity
+        self.ci = ci
+        self.samples = samples
+
+    def get_half_width(self):
+        return (self.ci[1] - self.ci[0]) / 2
+
+    def __str__(self):
+        return f'Equity {self.equity:.4f} [{self.ci[0]:.4f}, ' + \
+               f'{self.ci[1]:.4f}] (win {self.win:.4f}, ' + \
+               f'tie {self.tie:.4f}, lose {self.lose:.4f}; ' + \
+               f'{self.samples} samples)'
+
+    def __repr__(self):
+        return str(self)
+
+
+class EquityEstimator():
+    """
+    Running Monte Carlo equity estimate of `hero` (2 hole cards) on `board`
+    (0 to 5 cards) against `num_opponents` random hands. Samples can be
+    added incrementally with run() and the estimate read at any time.
+
+    Rep invariant:
+        len(hero) == 2
+        len(board) <= 5
+        1 <= num_opponents < 14
+        hero, board and remaining are disjoint card codes
+        wins + ties <= samples
+    """
+
+    def __init__(self, hero, board=None, num_opponents=1, rng=None):
+        self.hero = to_codes(hero)
+        self.board = to_codes([] if board is None else board)
+        self.num_opponents = num_opponents
+        self.rng = random if rng is None else rng
+
+        known = set(self.hero) | set(self.board)
+        if len(known) != len(self.hero) + len(self.board):
+            raise ValueError("Duplicate cards in hero hand and board")
+        if num_opponents < 1 or num_opponents >= MAX_NUM_PLAYERS:
+            raise ValueError("Unsupported number of opponents")
+        self.remaining = [c for c in Deck().deck if c not in known]
+        self.num_board_cards = MAX_CARDS_ON_TABLE - len(self.board)
+
+        self.samples = 0
+        self.wins = 0
+        self.ties = 0
+        self.equity_sum = 0.0
+        self.equity_sq_sum = 0.0
+        self._checkrep()
+
+    @checkrep_policy
+    def _checkrep(self):
+        assert len(self.hero) == STARTING_NUM_CARDS
+        assert len(self.board) <= MAX_CARDS_ON_TABLE
+        assert 1 <= self.num_opponents < MAX_NUM_PLAYERS
+        assert self.wins + self.ties <= self.samples
+
+    def run(self, num_samples):
+        """Adds `num_samples` sampled showdowns to the estimate."""
+        hero, board = self.hero, self.board
+        num_board_cards = self.num_board_cards
+        num_opponents = self.num_opponents
+        num_dealt = num_board_cards + STARTING_NUM_CARDS * num_opponents
+        sample, remaining = self.rng.sample, self.remaining
+        wins = ties = 0
+        equity_sum = equity_sq_sum = 0.0
+
+        for i in range(num_samples):
+            dealt = sample(remaining, num_dealt)
+            full_board = board + dealt[:num_board_cards]
+            hero_rank = evaluate(hero + full_board)
+
+            num_tied, lost = 1, False
+            for j in range(num_board_cards, num_dealt, STARTING_NUM_CARDS):
+                rank = evaluate(dealt[j:j + STARTING_NUM_CARDS] + full_board)
+                if rank < hero_rank:
+                    lost = True
+                    break
+                if rank == hero_rank:
+                    num_tied += 1
+
+            if lost:
+                continue
+            if num_tied == 1:
+                wins += 1
+                equity_sum += 1.0
+                equity_sq_sum += 1.0
+            else:
+                ties += 1
+                equity_sum += 1.0 / num_tied
+                equity_sq_sum += 1.0 / num_tied ** 2
+
+        self.samples += num_samples
+        self.wins += wins
+        self.ties += ties
+        self.equity_sum += equity_sum
+        self.equity_sq_sum += equity_sq_sum
+        self._checkrep()
+
+    def get_result(self, confidence=DEFAULT_CONFIDENCE):
+        """Current estimate with a normal-approximation confidence interval
+        at level `confidence`."""
+        self._checkrep()
+        n = self.samples
+        if n == 0:
+            return EquityResult(0.0, 0.0, 0.0, 0.0, (0.0, 1.0), 0)
+
+        mean = self.equity_sum / n
+        var = max(self.equity_sq_sum / n - mean * mean, 0.0)
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        half_width = z * (var / n) ** 0.5
+        ci = (max(mean - half_width, 0.0), min(mean + half_width, 1.0))
+        win, tie = self.wins / n, self.ties / n
+        return EquityResult(win, tie, 1.0 - win - tie, mean, ci, n)
+
+
+def equity(hero, board=None, num_opponents=1, precision=DEFAULT_PRECISION,
+           confidence=DEFAULT_CONFIDENCE, max_samples=DEFAULT_MAX_SAMPLES,
+           batch_size=DEFAULT_BATCH_SIZE, rng=None):
+    """
+    Estimates the showdown equity of `hero` on `board` against
+    `num_opponents` random hands. Samples in batches of `batch_size` and
+    stops as soon as the confidence interval half-width is at most
+    `precision` (None to always run `max_samples`).
+    """
+    estimator = EquityEstimator(hero, board, num_opponents, rng)
+    while estimator.samples < max_samples:
+        estimator.run(min(batch_size, max_samples - estimator.samples))
+        result = estimator.get_result(confidence)
+        if precision is not None and result.get_half_width() <= precision:
+            return result
+    return estimator.get_result(confidence)
+
+
+class EquityStrategy(Strategy):
+    """
+    Anytime equity strategy. For each decision it samples showdowns against
+    the players still in the hand until `time_budget` seconds have passed
+    or `max_samples` are taken, whichever comes first, then compares the
+    estimated equity with the pot odds of paying round_cost:
+        equity < pot odds                       fold (check if free)
+        equity >= all_in_equity                 all-in
+        equity >= raise_factor / num_players    raise pot * (equity - odds),
+                                                at least min_raise
+        otherwise                               check
+    Sample counts of the last decide or decide_batch call are kept in the
+    list last_samples; decisions and samples count all decisions made. The
+    'equity' entry of Player.strategies is one instance shared by every
+    player using it, so its counters cover all of them; give players their
+    own registered instance to count per player.
+    """
+
+    def __init__(self, time_budget=DEFAULT_TIME_BUDGET,
+                 max_samples=DEFAULT_DECISION_SAMPLES, raise_factor=1.5,
+                 all_in_equity=0.85, min_raise=10, rng=None):
+        self.time_budget = time_budget
+        self.max_samples = max_samples
+        self.raise_factor = raise_factor
+        self.all_in_equity = all_in_equity
+        self.min_raise = min_raise
+        self.rng = rng
+        self.last_samples = []
+        self.decisions = 0
+        self.samples = 0
+
+    def estimate(self, hole, board, num_opponents):
+        """Equity of `hole` on `board` against `num_opponents` random hands
+        within the time budget; returns (equity, samples taken)."""
+        estimator = EquityEstimator(hole, board, num_opponents, self.rng)
+        start = time.perf_counter()
+        deadline = start + self.time_budget
+        step = MIN_STEP_SAMPLES
+        while estimator.samples < self.max_samples:
+            estimator.run(min(step, self.max_samples - estimator.samples))
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            # Size the next step to the time left so the deadline is not
+            # overshot by more than a few samples
+            per_sample = (now - start) / estimator.samples
+            step = int((deadline - now) / per_sample) if per_sample else \
+                MAX_STEP_SAMPLES
+            step = max(1, min(step, MAX_STEP_SAMPLES))
+        return estimator.get_result().equity, estimator.samples
+
+    def decide(self, state):
+        num_opponents = state.num_players - 1
+        action, amount, samples = CHECK, 0, 0
+        if num_opponents >= 1 and not state.all_in and \
+                len(state.hole) == STARTING_NUM_CARDS:
+            equity, samples = self.estimate(list(state.hole),
+                                            list(state.board), num_opponents)
+            pot, cost, stack = state.pot, state.round_cost, state.stack
+            pot_odds = cost / (pot + cost) if cost else 0.0
+            if equity < pot_odds:
+                action = FOLD
+            elif equity >= self.all_in_equity:
+                action = ALL_IN
+            elif equity * (num_opponents + 1) >= self.raise_factor and \
+                    stack > cost:
+                action = RAISE
+                amount = min(stack, max(self.min_raise,
+                                        int(pot * (equity - pot_odds))))
+
+        self.last_samples = [samples]
+        self.decisions += 1
+        self.samples += samples
+        return action, amount
+
+    def decide_batch(self, states):
+        n = len(states)
+        actions = np.full(n, CHECK, np.int8)
+        amounts = np.zeros(n, states.stack.dtype)
+        samples = []
+        for i in range(n):
+            state = Decision(
+                [c for c in states.hole[i].tolist() if c != NO_CARD],
+                states.board[i, :states.board_size[i]].tolist(),
+                states.pot[i].item(), states.round_cost[i].item(),
+                states.stack[i].item(), states.position[i].item(),
+                states.num_players[i].item(), states.all_in[i].item())
+            actions[i], amounts[i] = self.decide(state)
+            samples += self.last_samples
+        self.last_samples = samples
+        return actions, amounts
+
+
+if __name__ == '__main__':
+    aces = [Card('Spades', 'A'), Card('Hearts', 'A')]
+    for num_opponents in (1, 3, 8):
+        print(num_opponents, equity(aces, num_opponents=num_opponents))
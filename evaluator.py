@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Lookup-table poker hand evaluator (Cactus Kev style) over integer card codes.
+
+Cards are the integer codes used by utils (code = 4 * rank + suit, rank 0-12
+for 2 through A). Every 5-card hand maps to a single rank in [1, 7462] where
+a lower number is a better hand: 1 is a royal flush, 7462 is 7-5-4-3-2 high.
+
+Three tables are built once at import time:
+    FLUSH_RANKS[mask]    rank of a flush whose 13-bit rank mask is `mask`
+    UNIQUE5_RANKS[mask]  rank of a non-flush hand of 5 distinct ranks
+    PAIRED_RANKS[prod]   rank of a hand with a repeated rank, keyed by the
+                         product of the primes of its 5 ranks
+"""
+
+from bisect import bisect_left
+from collections import OrderedDict
+from itertools import combinations, combinations_with_replacement
+from threading import Lock
+
+HAND_RANKINGS = ['royal flush', 'straight flush', 'four of a kind',
+                 'full house', 'flush', 'straight', 'three of a kind',
+                 'two pair', 'one pair', 'high card']
+NUM_RANKS = 13
+CARDS_IN_A_DECK = 52
+PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+WHEEL_MASK = 0b1000000001111                    # A-2-3-4-5
+ROYAL_MASK = 0b1111100000000                    # 10-J-Q-K-A
+STRAIGHT_MASKS = [0b11111 << i for i in range(NUM_RANKS - 4)] + [WHEEL_MASK]
+
+# Per-card lookups indexed by card code
+CARD_BITS = tuple(1 << (c >> 2) for c in range(CARDS_IN_A_DECK))
+CARD_PRIMES = tuple(PRIMES[c >> 2] for c in range(CARDS_IN_A_DECK))
+DEFAULT_CACHE_SIZE = 1 << 16
+
+
+def _straight_high(mask):
+    """Returns the rank index of the top card of the straight in `mask`,
+    or -1 if `mask` is not exactly a straight."""
+    if mask == WHEEL_MASK:
+        return 3
+    if mask in STRAIGHT_MASKS:
+        return mask.bit_length() - 1
+    return -1
+
+
+def _strength(ranks, flush):
+    """Sort key for a 5-card hand given its rank indices; smaller is better.
+    Returns (category index into HAND_RANKINGS, tiebreak tuple)."""
+    counts = {}
+    for r in ranks:
+        counts[r] = counts.get(r, 0) + 1
+    groups = sorted(((cnt, r) for r, cnt in counts.items()), reverse=True)
+    shape = tuple(cnt for cnt, _ in groups)
+    tiebreak = tuple(-r for _, r in groups)
+
+    mask = 0
+    for r in ranks:
+        mask |= 1 << r
+    high = _straight_high(mask) if len(counts) == 5 else -1
+
+    if flush and mask == ROYAL_MASK:
+        return 0, ()
+    if flush and high >= 0:
+        return 1, (-high, )
+    if shape == (4, 1):
+        return 2, tiebreak
+    if shape == (3, 2):
+        return 3, tiebreak
+    if flush:
+        return 4, tiebreak
+    if high >= 0:
+        return 5, (-high, )
+    if shape == (3, 1, 1):
+        return 6, tiebreak
+    if shape == (2, 2, 1):
+        return 7, tiebreak
+    if shape == (2, 1, 1, 1):
+        return 8, tiebreak
+    return 9, tiebreak
+
+
+def _build_tables():
+    entries = []
+    for ranks in combinations(range(NUM_RANKS), 5):
+        entries.append((_strength(ranks, True), True, ranks))
+    for ranks in combinations_with_replacement(range(NUM_RANKS), 5):
+        if max(ranks.count(r) for r in ranks) <= 4:
+            entries.append((_strength(ranks, False), False, ranks))
+    entries.sort()
+
+    flush_ranks = [0] * (1 << NUM_RANKS)
+    unique5_ranks = [0] * (1 << NUM_RANKS)
+    paired_ranks = {}
+    category_bounds = [0] * len(HAND_RANKINGS)
+    for rank, ((category, _), flush, ranks) in enumerate(entries, 1):
+        mask, prod = 0, 1
+        for r in ranks:
+            mask |= 1 << r
+            prod *= PRIMES[r]
+        if flush:
+            flush_ranks[mask] = rank
+        elif len(set(ranks)) == 5:
+            unique5_ranks[mask] = rank
+        else:
+            paired_ranks[prod] = rank
+        category_bounds[category] = rank
+    return flush_ranks, unique5_ranks, paired_ranks, category_bounds
+
+
+FLUSH_RANKS, UNIQUE5_RANKS, PAIRED_RANKS, CATEGORY_BOUNDS = _build_tables()
+WORST_RANK = CATEGORY_BOUNDS[-1]
+
+
+def evaluate5(cards):
+    """Returns the rank (1 = best, 7462 = worst) of 5 integer card codes."""
+    a, b, c, d, e = cards
+    mask = CARD_BITS[a] | CARD_BITS[b] | CARD_BITS[c] | CARD_BITS[d] | \
+        CARD_BITS[e]
+    if a & 3 == b & 3 == c & 3 == d & 3 == e & 3:
+        return FLUSH_RANKS[mask]
+    rank = UNIQUE5_RANKS[mask]
+    if rank:
+        return rank
+    return PAIRED_RANKS[CARD_PRIMES[a] * CARD_PRIMES[b] * CARD_PRIMES[c] *
+                        CARD_PRIMES[d] * CARD_PRIMES[e]]
+
+
+def rank_category_index(rank):
+    """Index into HAND_RANKINGS of the category of hand rank `rank`."""
+    assert 1 <= rank <= WORST_RANK
+    return bisect_left(CATEGORY_BOUNDS, rank)
+
+
+def rank_category(rank):
+    """Name (as in HAND_RANKINGS) of the category of hand rank `rank`."""
+    return HAND_RANKINGS[rank_category_index(rank)]
+
+
+def _build_best_tables():
+    """Best flush and best straight rank for every 13-bit rank mask, or 0 if
+    the mask holds no flush (fewer than 5 ranks) or no straight."""
+    flush_best = [0] * (1 << NUM_RANKS)
+    straight_best = [0] * (1 << NUM_RANKS)
+    straights = sorted(STRAIGHT_MASKS, key=lambda m: FLUSH_RANKS[m])
+    for mask in range(1 << NUM_RANKS):
+        for straight in straights:
+            if mask & straight == straight:
+                flush_best[mask] = FLUSH_RANKS[straight]
+                straight_best[mask] = UNIQUE5_RANKS[straight]
+                break
+        else:
+            if bin(mask).count('1') >= 5:
+                top5 = mask
+                while bin(top5).count('1') > 5:
+                    top5 &= top5 - 1                # Drop the lowest rank
+                flush_best[mask] = FLUSH_RANKS[top5]
+    return flush_best, straight_best
+
+
+FLUSH_BEST, STRAIGHT_BEST = _build_best_tables()
+
+
+def _top_ranks(counts, num, exclude=()):
+    """Highest `num` distinct rank indices present in `counts`, skipping any
+    rank in `exclude`."""
+    ranks = []
+    for r in range(NUM_RANKS - 1, -1, -1):
+        if counts[r] and r not in exclude:
+            ranks.append(r)
+            if len(ranks) == num:
+                break
+    return ranks
+
+
+def rank_from_state(suit_masks, counts):
+    """Returns the rank of the best 5-card hand held by 5 to 7 cards given as
+    per-suit 13-bit rank masks and a 13-slot rank count array."""
+    for mask in suit_masks:
+        # 5+ cards of a suit out of at most 7 rules out quads and full houses
+        if FLUSH_BEST[mask]:
+            return FLUSH_BEST[mask]
+
+    quads, trips, pairs = [], [], []
+    for r in range(NUM_RANKS - 1, -1, -1):
+        cnt = counts[r]
+        if cnt == 4:
+            quads.append(r)
+        elif cnt == 3:
+            trips.append(r)
+        elif cnt == 2:
+            pairs.append(r)
+
+    if quads:
+        q = quads[0]
+        k, = _top_ranks(counts, 1, (q, ))
+        return PAIRED_RANKS[PRIMES[q] ** 4 * PRIMES[k]]
+    if trips and (len(trips) > 1 or pairs):
+        t = trips[0]
+        p = max(trips[1:2] + pairs[:1])
+        return PAIRED_RANKS[PRIMES[t] ** 3 * PRIMES[p] ** 2]
+
+    straight = STRAIGHT_BEST[suit_masks[0] | suit_masks[1] |
+                             suit_masks[2] | suit_masks[3]]
+    if straight:
+        return straight
+
+    if trips:
+        t = trips[0]
+        k1, k2 = _top_ranks(counts, 2, (t, ))
+        return PAIRED_RANKS[PRIMES[t] ** 3 * PRIMES[k1] * PRIMES[k2]]
+    if len(pairs) >= 2:
+        p1, p2 = pairs[0], pairs[1]
+        k, = _top_ranks(counts, 1, (p1, p2))
+        return PAIRED_RANKS[PRIMES[p1] ** 2 * PRIMES[p2] ** 2 * PRIMES[k]]
+    if pairs:
+        p = pairs[0]
+        k1, k2, k3 = _top_ranks(counts, 3, (p, ))
+        return PAIRED_RANKS[PRIMES[p] ** 2 * PRIMES[k1] * PRIMES[k2] *
+                            PRIMES[k3]]
+    mask = 0
+    for r in _top_ranks(counts, 5):
+        mask |= 1 << r
+    return UNIQUE5_RANKS[mask]
+
+
+def evaluate(cards):
+    """Returns the rank of the best 5-card hand among 5 to 7 integer card
+    codes, e.g. 2 hole cards plus a 5-card board, in a single pass."""
+    suit_masks = [0, 0, 0, 0]
+    counts = [0] * NUM_RANKS
+    for c in cards:
+        suit_masks[c & 3] |= CARD_BITS[c]
+        counts[c >> 2] += 1
+    return rank_from_state(suit_masks, counts)
+
+
+def card_mask(cards):
+    """Order-independent key of a set of card codes: a 52-bit mask."""
+    mask = 0
+    for c in cards:
+        mask |= 1 << c
+    return mask
+
+
+class RankCache():
+    """
+    Bounded LRU memoization of hand ranks, keyed by the card_mask of the
+    cards so any ordering of the same cards shares an entry. Holds 5- to
+    7-card hands and counts hits and misses. Safe to share between threads.
+
+    Rep invariant:
+        len(ranks) <= maxsize
+        hits, misses >= 0
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        if maxsize < 1:
+            raise ValueError("Cache size must be at least 1")
+        self.maxsize = maxsize
+        self.ranks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get_rank(self, cards, key=None):
+        """Rank of the best hand in `cards` (5 to 7 codes); `key` may pass
+        a precomputed card_mask."""
+        key = card_mask(cards) if key is None else key
+        with self.lock:
+            rank = self.ranks.get(key)
+            if rank is not None:
+                self.ranks.move_to_end(key)
+                self.hits += 1
+                return rank
+
+        rank = evaluate5(cards) if len(cards) == 5 else evaluate(cards)
+        with self.lock:
+            self.misses += 1
+            self.ranks[key] = rank
+            if len(self.ranks) > self.maxsize:
+                self.ranks.popitem(last=False)
+        return rank
+
+    def get_stats(self):
+        """Hit/miss counters and occupancy as a dict."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'size': len(self.ranks), 'maxsize': self.maxsize}
+
+    def clear(self):
+        with self.lock:
+            self.ranks.clear()
+            self.hits = self.misses = 0
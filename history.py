@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Compact binary hand histories.
+
+A log is a pair of files, `<path>.rounds` and `<path>.actions`, each a small
+header followed by fixed-width little-endian records (ROUND_DTYPE and
+ACTION_DTYPE). Cards are stored as integer codes (NO_CARD_U8 for none) and
+amounts as integers. HandHistoryWriter appends to a log, usually as the
+`recorder` of a PokerGame; HandHistory memory-maps one and exposes every
+field as a NumPy column without parsing.
+"""
+
+import os
+import struct
+
+import numpy as np
+
+from utils import MAX_NUM_PLAYERS, MAX_CARDS_ON_TABLE, STARTING_NUM_CARDS, \
+    checkrep_policy
+
+MAGIC_ROUNDS = b'PHHR'
+MAGIC_ACTIONS = b'PHHA'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')          # magic, version, record size
+NO_CARD_U8 = 255                         # strategy.NO_CARD in u1 columns
+NO_SEAT = 255
+DEFAULT_BUFFER_ROUNDS = 1024
+
+ACTIONS = ('Fold', 'Check', 'Raise', 'Small blind', 'Big blind')
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+
+ROUND_DTYPE = np.dtype([
+    ('round', '<u4'),
+    ('num_players', 'u1'),
+    ('small_blind', 'u1'),               # Seat indices, NO_SEAT if unknown
+    ('big_blind', 'u1'),
+    ('num_winners', 'u1'),
+    ('board', 'u1', (MAX_CARDS_ON_TABLE,)),
+    ('hole', 'u1', (MAX_NUM_PLAYERS, STARTING_NUM_CARDS)),
+    ('pot', '<i4'),
+    ('payouts', '<i4', (MAX_NUM_PLAYERS,)),
+    ('first_action', '<u8'),             # Row of the round's first action
+    ('num_actions', '<u2'),
+])
+
+ACTION_DTYPE = np.dtype([
+    ('round', '<u4'),
+    ('seat', 'u1'),
+    ('action', 'u1'),                    # Index into ACTIONS
+    ('board_size', 'u1'),                # Board cards out when acting
+    ('amount', '<i4'),                   # Amount paid into the pot
+])
+
+
+def _to_int(amount):
+    if amount != int(amount):
+        raise ValueError(f"Hand histories store integer amounts: {amount}")
+    return int(amount)
+
+
+def _open_log(path, magic, dtype):
+    """Opens `path` for appending, writing a header if it is new, and
+    returns (file, number of records already in it)."""
+    f = open(path, 'ab')
+    try:
+        size = f.tell()
+        if size == 0:
+            f.write(HEADER.pack(magic, VERSION, dtype.itemsize))
+            return f, 0
+        _check_header(path, magic, dtype)
+    except BaseException:
+        f.close()
+        raise
+    return f, (size - HEADER.size) // dtype.itemsize
+
+
+def _check_header(path, magic, dtype):
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size or \
+            HEADER.unpack(header) != (magic, VERSION, dtype.itemsize):
+        raise ValueError(f"Not a version {VERSION} hand history: {path}")
+
+
+class HandHistoryWriter():
+    """
+    Appends rounds to the hand-history log at `path`. Records are buffered
+    and written every `buffer_rounds` rounds, on flush() and on close().
+    Pass an instance as PokerGame(..., recorder=writer), or call
+    record_action / record_round directly.
+
+    Rep invariant:
+        num_rounds >= 0
+        num_actions >= 0
+        pending actions all belong to the round being recorded
+    """
+
+    def __init__(self, path, buffer_rounds=DEFAULT_BUFFER_ROUNDS):
+        self.path = path
+        self.buffer_rounds = buffer_rounds
+        self.rounds_file, self.num_rounds = _open_log(
+            f'{path}.rounds', MAGIC_ROUNDS, ROUND_DTYPE)
+        try:
+            self.actions_file, self.num_actions = _open_log(
+                f'{path}.actions', MAGIC_ACTIONS, ACTION_DTYPE)
+        except BaseException:
+            self.rounds_file.close()
+            raise
+        self.rounds = []                 # Buffered round records
+        self.actions = []                # Buffered action records
+        self.round_actions = 0           # Actions of the round in progress
+        self._checkrep()
+
+    @checkrep_policy
+    def _checkrep(self):
+        assert self.num_rounds >= 0
+        assert self.num_actions >= 0
+        assert 0 <= self.round_actions <= len(self.actions)
+
+    def record_action(self, round_num, seat, action, board_size, amount):
+        """Adds an action (a name in ACTIONS) of the round in progress."""
+        self.actions.append((round_num, seat, ACTION_CODES[action],
+                             board_size, _to_int(amount)))
+        self.round_actions += 1
+
+    def record_round(self, round_num, hole_cards, board, pot, payouts,
+                     small_blind=NO_SEAT, big_blind=NO_SEAT):
+        """
+        Completes the round in progress. `hole_cards` holds each seat's
+        card codes, `payouts` the amount each seat won (in seat order).
+        """
+        num_players = len(hole_cards)
+        hole = [[NO_CARD_U8] * STARTING_NUM_CARDS
+                for i in range(MAX_NUM_PLAYERS)]
+        for seat, codes in enumerate(hole_cards):
+            hole[seat][:len(codes)] = codes
+        board = list(board) + [NO_CARD_U8] * (MAX_CARDS_ON_TABLE - len(board))
+        payouts = [_to_int(p) for p in payouts]
+        num_winners = sum(1 for p in payouts if p > 0)
+        payouts += [0] * (MAX_NUM_PLAYERS - num_players)
+
+        first_action = self.num_actions + len(self.actions) - \
+            self.round_actions
+        self.rounds.append((round_num, num_players, small_blind, big_blind,
+                            num_winners, board, hole, _to_int(pot), payouts,
+                            first_action, self.round_actions))
+        self.round_actions = 0
+        if len(self.rounds) >= self.buffer_rounds:
+            self.flush()
+
+    def flush(self):
+        """Writes buffered completed rounds and their actions."""
+        num_pending = self.round_actions
+        done = self.actions[:len(self.actions) - num_pending]
+        if self.rounds:
+            self.rounds_file.write(
+                np.array(self.rounds, dtype=ROUND_DTYPE).tobytes())
+        if done:
+            self.actions_file.write(
+                np.array(done, dtype=ACTION_DTYPE).tobytes())
+        self.num_rounds += len(self.rounds)
+        self.num_actions += len(done)
+        self.rounds = []
+        self.actions = self.actions[len(done):]
+        self.rounds_file.flush()
+        self.actions_file.flush()
+        self._checkrep()
+
+    def close(self):
+        self.flush()
+        self.rounds_file.close()
+        self.actions_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class HandHistory():
+    """
+    Read-only, memory-mapped view of the hand-history log at `path`.
+        rounds (np.ndarray): ROUND_DTYPE records, one per round
+        actions (np.ndarray): ACTION_DTYPE records, in play order
+    Columns are views into the file, e.g. history['pot'] or
+    history.actions['amount']. close() (or leaving a `with` block) drops
+    the maps; each file is unmapped once no views of it remain.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rounds = self._map(f'{path}.rounds', MAGIC_ROUNDS, ROUND_DTYPE)
+        try:
+            self.actions = self._map(f'{path}.actions', MAGIC_ACTIONS,
+                                     ACTION_DTYPE)
+        except BaseException:
+            self.close()
+            raise
+
+    @staticmethod
+    def _map(path, magic, dtype):
+        _check_header(path, magic, dtype)
+        count = (os.path.getsize(path) - HEADER.size) // dtype.itemsize
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', offset=HEADER.size,
+                         shape=(count,))
+
+    def get_round_actions(self, i):
+        """Action records of the i-th round."""
+        first = int(self.rounds['first_action'][i])
+        return self.actions[first:first + int(self.rounds['num_actions'][i])]
+
+    def close(self):
+        self.rounds = np.zeros(0, dtype=ROUND_DTYPE)
+        self.actions = np.zeros(0, dtype=ACTION_DTYPE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getitem__(self, column):
+        return self.rounds[column]
+
+    def __len__(self):
+        return len(self.rounds)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Suit-isomorphism canonicalization of hole cards and boards.
+
+Two deals that differ only by a relabeling of the suits are strategically
+identical. canonicalize() maps hole cards + board to the representative of
+their class (the lexicographically smallest relabeling, with each street
+sorted) and returns the suit permutation used, so the original cards can be
+recovered with decanonicalize(). canonical_index() turns a canonical form
+into a single integer key and from_canonical_index() reverses it.
+
+For example the 22,100 flops fall into 1,755 classes, and the 1,326 hole
+card combinations into the 169 preflop classes.
+"""
+
+from itertools import permutations
+from math import comb
+
+from utils import CARDS_IN_A_DECK, NUM_SUITS, to_codes
+
+SUIT_PERMUTATIONS = tuple(permutations(range(NUM_SUITS)))
+
+# PERMUTED_CODES[i][code] = code with its suit relabeled by permutation i
+PERMUTED_CODES = tuple(
+    tuple((code & ~3) | perm[code & 3] for code in range(CARDS_IN_A_DECK))
+    for perm in SUIT_PERMUTATIONS)
+
+
+def apply_suit_permutation(cards, perm):
+    """Relabels the suits of card codes: suit s becomes perm[s]."""
+    return tuple((code & ~3) | perm[code & 3] for code in cards)
+
+
+def invert_permutation(perm):
+    inverse = [0] * len(perm)
+    for suit, image in enumerate(perm):
+        inverse[image] = suit
+    return tuple(inverse)
+
+
+def canonicalize(hole, board=()):
+    """
+    Canonical form of `hole` cards and `board` (Card objects or codes).
+    Returns (canonical_hole, canonical_board, perm), where the canonical
+    streets are sorted tuples of codes and perm is the suit permutation that
+    maps the input onto them.
+    """
+    hole, board = to_codes(hole), to_codes(board)
+    best, best_i = None, 0
+    for i, table in enumerate(PERMUTED_CODES):
+        key = (tuple(sorted(table[c] for c in hole)),
+               tuple(sorted(table[c] for c in board)))
+        if best is None or key < best:
+            best, best_i = key, i
+    return best[0], best[1], SUIT_PERMUTATIONS[best_i]
+
+
+def decanonicalize(canonical_hole, canonical_board, perm):
+    """Maps a canonical form back through the inverse of `perm`, giving the
+    original cards (each street sorted)."""
+    inverse = invert_permutation(perm)
+    return (tuple(sorted(apply_suit_permutation(canonical_hole, inverse))),
+            tuple(sorted(apply_suit_permutation(canonical_board, inverse))))
+
+
+def is_canonical(hole, board=()):
+    hole, board = tuple(to_codes(hole)), tuple(to_codes(board))
+    return canonicalize(hole, board)[:2] == (hole, board)
+
+
+def combination_index(codes):
+    """Colex rank of a set of distinct card codes among all sets of its
+    size (combinatorial number system)."""
+    return sum(comb(code, i + 1) for i, code in enumerate(sorted(codes)))
+
+
+def combination_from_index(index, size):
+    """Inverse of combination_index: the sorted codes of rank `index`."""
+    codes = []
+    for k in range(size, 0, -1):
+        code = k - 1
+        while comb(code + 1, k) <= index:
+            code += 1
+        codes.append(code)
+        index -= comb(code, k)
+    return tuple(reversed(codes))
+
+
+def canonical_index(hole, board=()):
+    """
+    Integer key of the isomorphism class of `hole` + `board`: the colex
+    ranks of the canonical hole cards and board, combined. Keys are unique
+    per class for a given number of hole and board cards but not dense.
+    """
+    canonical_hole, canonical_board, _ = canonicalize(hole, board)
+    return combination_index(canonical_hole) * \
+        comb(CARDS_IN_A_DECK, len(canonical_board)) + \
+        combination_index(canonical_board)
+
+
+def from_canonical_index(index, num_hole, num_board):
+    """Canonical (hole, board) of an index from canonical_index()."""
+    hole_index, board_index = divmod(index, comb(CARDS_IN_A_DECK, num_board))
+    return (combination_from_index(hole_index, num_hole),
+            combination_from_index(board_index, num_board))
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Lockstep multi-table engine.
+
+MultiTableGame plays thousands of independent PokerGames at once. Balances,
+statuses, hole cards, boards and pots of every table live in flat NumPy
+arrays (one row per table), and every table goes through dealing, each
+betting turn and the showdown together, with masks for tables that have
+finished the current round or game. The rules are those of
+PokerGame.play_round / execute_action, quirks included: cards are dealt in
+the same order from a deck, so both engines play the same deck identically.
+
+Player decisions come from a policy, a function (game, tables, seats) ->
+(actions, amounts) over arrays of acting seats (see check_policy and
+random_policy), or from a strategy.Strategy, which gets the acting seats'
+DecisionStates as one batch.
+"""
+
+from itertools import combinations_with_replacement
+
+import numpy as np
+
+from evaluator import evaluate, FLUSH_BEST, PRIMES
+from strategy import Strategy, DecisionState, NO_CARD, FOLD, CHECK, RAISE, \
+    ALL_IN, ACTIONS, DEFAULT_RAISE
+from utils import CARDS_IN_A_DECK, STARTING_NUM_CARDS, MAX_CARDS_ON_TABLE, \
+    MIN_NUM_PLAYERS, MAX_NUM_PLAYERS, NUM_RANKS, NUM_SUITS, checkrep_policy
+
+CARDS_IN_7 = STARTING_NUM_CARDS + MAX_CARDS_ON_TABLE
+
+# Seat statuses, as in PokerGame.player_status
+ACTIVE, CHECKED, FOLDED, INACTIVE = range(4)
+STATUSES = ('Active', 'Checked', 'Folded', 'Inactive')
+
+NO_BLIND, SMALL_BLIND, BIG_BLIND = range(3)
+
+_CARD_BITS = np.array([1 << (c >> 2) for c in range(CARDS_IN_A_DECK)],
+                      dtype=np.int32)
+_FLUSH_BEST = np.array(FLUSH_BEST, dtype=np.int32)
+_PRIMES = np.array(PRIMES, dtype=np.int64)
+_nonflush_table = None
+
+
+def _get_nonflush_table():
+    """
+    (keys, ranks) over every multiset of 7 ranks: keys are the sorted prime
+    products of the ranks and ranks the rank of the best hand they make
+    without a flush. Built on first use.
+    """
+    global _nonflush_table
+    if _nonflush_table is None:
+        keys, ranks = [], []
+        for multiset in combinations_with_replacement(range(NUM_RANKS),
+                                                      CARDS_IN_7):
+            if max(multiset.count(r) for r in multiset) > NUM_SUITS:
+                continue
+            # Copies of a rank are adjacent so get distinct suits, and no
+            # suit gets more than 2 cards, so there is no flush
+            codes = [NUM_SUITS * r + i % NUM_SUITS
+                     for i, r in enumerate(multiset)]
+            key = 1
+            for r in multiset:
+                key *= PRIMES[r]
+            keys.append(key)
+            ranks.append(evaluate(codes))
+        keys, ranks = np.array(keys, np.int64), np.array(ranks, np.int32)
+        order = np.argsort(keys)
+        _nonflush_table = keys[order], ranks[order]
+    return _nonflush_table
+
+
+def evaluate_batch(cards):
+    """
+    Vectorized evaluator.evaluate over an (n, 7) array of card codes:
+    returns the n ranks (1 = best) of the best 5-card hand in each row.
+    """
+    cards = np.asarray(cards, dtype=np.int64)
+    assert cards.ndim == 2 and cards.shape[1] == CARDS_IN_7
+    bits, suits = _CARD_BITS[cards], cards & 3
+
+    # 5+ cards of a suit out of 7 rule out quads and full houses, so a
+    # flush (or straight flush) is always the best hand
+    flush = np.zeros(len(cards), np.int32)
+    for suit in range(NUM_SUITS):
+        mask = np.bitwise_or.reduce(np.where(suits == suit, bits, 0), axis=1)
+        flush = np.maximum(flush, _FLUSH_BEST[mask])
+
+    keys, ranks = _get_nonflush_table()
+    nonflush = ranks[np.searchsorted(keys, _PRIMES[cards >> 2].prod(axis=1))]
+    return np.where(flush > 0, flush, nonflush)
+
+
+def check_policy(game, tables, seats):
+    """Every player checks, like Player's 'check' strategy."""
+    return np.full(len(tables), CHECK, np.int8), \
+        np.zeros(len(tables), np.int64)
+
+
+def random_policy(game, tables, seats):
+    """Uniform choice of fold, check, raise and all-in like Player's
+    'random' strategy, raising 10 (or the whole balance if less)."""
+    actions = game.rng.integers(len(ACTIONS), size=len(tables))
+    amounts = np.minimum(DEFAULT_RAISE, game.bal[tables, seats])
+    return actions.astype(np.int8), amounts
+
+
+def strategy_policy(strategy):
+    """Policy asking `strategy` for the decisions of all acting seats in a
+    single decide_batch call."""
+    def policy(game, tables, seats):
+        return strategy.decide_batch(game.get_decision_states(tables, seats))
+    return policy
+
+
+def _kth_seat(mask, k):
+    """Seat of the k-th (0-based) True entry of each row of `mask`."""
+    return np.argmax(np.cumsum(mask, axis=1) > k[:, None], axis=1)
+
+
+class MultiTableGame():
+    """
+    `num_tables` games of `num_players` players with starting balance `bal`
+    and cost to play `cost`, as structure-of-arrays state (T tables, P
+    seats):
+        bal (T, P): balances
+        status (T, P): ACTIVE, CHECKED, FOLDED or INACTIVE
+        all_in (T, P): all-in flags
+        hole (T, P, 2): hole card codes, NO_CARD if none
+        board (T, 5), board_size (T): board card codes and count
+        deck (T, 52), next_card (T): this round's deck order and the
+                                     position of its next (burn) card
+        pot, round_cost, round (T): as in PokerGame
+        small_seat, big_seat (T): seats paying this round's blinds
+        playing_i (T): index of the acting player among those still in the
+                       hand (PokerGame's playing_i)
+    A table whose game is over (fewer than 2 players with money) is skipped.
+
+    Rep invariant:
+        MIN_NUM_PLAYERS <= num_players <= MAX_NUM_PLAYERS
+        bal >= 0, pot >= 0, round_cost >= 0
+        bal.sum(axis=1) + pot == num_players * starting balance
+        0 <= board_size <= 5
+
+    Abstraction function:
+        AF(...) = num_tables PokerGames, table i made of row i of each array
+    """
+
+    def __init__(self, num_tables, num_players, bal, cost, policy=None,
+                 seed=None):
+        if not MIN_NUM_PLAYERS <= num_players <= MAX_NUM_PLAYERS:
+            raise ValueError("Unsupported number of players")
+        self.num_tables = num_tables
+        self.num_players = num_players
+        self.cost = cost
+        if isinstance(policy, Strategy):
+            policy = strategy_policy(policy)
+        self.policy = check_policy if policy is None else policy
+        self.rng = np.random.default_rng(seed)
+        self.start_amount = num_players * bal
+
+        shape = (num_tables, num_players)
+        self.bal = np.full(shape, bal, np.int64)
+        self.status = np.full(shape, ACTIVE, np.int8)
+        self.all_in = np.zeros(shape, bool)
+        self.hole = np.full(shape + (STARTING_NUM_CARDS, ), NO_CARD, np.int8)
+        self.board = np.full((num_tables, MAX_CARDS_ON_TABLE), NO_CARD,
+                             np.int8)
+        self.board_size = np.zeros(num_tables, np.int64)
+        self.deck = np.zeros((num_tables, CARDS_IN_A_DECK), np.int8)
+        self.next_card = np.zeros(num_tables, np.int64)
+        self.pot = np.zeros(num_tables, np.int64)
+        self.round_cost = np.full(num_tables, cost, np.int64)
+        self.round = np.zeros(num_tables, np.int64)
+        self.small_seat = np.zeros(num_tables, np.int64)
+        self.big_seat = np.zeros(num_tables, np.int64)
+        self.playing_i = np.zeros(num_tables, np.int64)
+        self._checkrep()
+
+    @checkrep_policy
+    def _checkrep(self):
+        assert MIN_NUM_PLAYERS <= self.num_players <= MAX_NUM_PLAYERS
+        assert (self.bal >= 0).all()
+        assert (self.pot >= 0).all()
+        assert (self.round_cost >= 0).all()
+        assert (self.bal.sum(axis=1) + self.pot == self.start_amount).all()
+        assert ((0 <= self.board_size) &
+                (self.board_size <= MAX_CARDS_ON_TABLE)).all()
+
+    def get_live_tables(self):
+        """Mask of tables whose game is still going (2+ solvent players)."""
+        return (self.bal > 0).sum(axis=1) >= MIN_NUM_PLAYERS
+
+    def get_decision_states(self, tables, seats):
+        """DecisionState batch of the players at `seats` of `tables`."""
+        rows = np.arange(len(tables))
+        dealt = self.hole[tables, :, 0] != NO_CARD
+        order = np.cumsum(dealt, axis=1) - 1
+        small = order[rows, self.small_seat[tables]]
+        position = (order[rows, seats] - small) % dealt.sum(axis=1)
+        status = self.status[tables]
+        num_players = ((status == ACTIVE) | (status == CHECKED)).sum(axis=1)
+        return DecisionState(self.hole[tables, seats], self.board[tables],
+                             self.pot[tables], self.round_cost[tables],
+                             self.bal[tables, seats], position, num_players,
+                             self.all_in[tables, seats])
+
+    def get_winners(self):
+        """(T, P) mask of each table's richest players."""
+        return self.bal == self.bal.max(axis=1, keepdims=True)
+
+    def _deal(self, tables, decks):
+        n = len(tables)
+        if decks is None:
+            decks = self.rng.permuted(
+                np.tile(np.arange(CARDS_IN_A_DECK, dtype=np.int8), (n, 1)),
+                axis=1)
+        self.deck[tables] = decks
+
+        # Players without money fold for the round, as in play_round
+        active = self.bal[tables] > 0
+        self.status[tables] = np.where(active, ACTIVE, FOLDED)
+        num_active = active.sum(axis=1)
+
+        # Hole cards go one at a time around the active players
+        order = np.cumsum(active, axis=1) - 1
+        hole = np.full((n, self.num_players, STARTING_NUM_CARDS), NO_CARD,
+                       np.int8)
+        for i in range(STARTING_NUM_CARDS):
+            positions = i * num_active[:, None] + order
+            hole[:, :, i] = np.where(
+                active, np.take_along_axis(decks, positions, axis=1), NO_CARD)
+        self.hole[tables] = hole
+        self.next_card[tables] = STARTING_NUM_CARDS * num_active
+
+        # Blinds, indexed among the active players
+        small_i = self.round[tables] % num_active
+        big_i = (self.round[tables] + 1) % num_active
+        small, big = _kth_seat(active, small_i), _kth_seat(active, big_i)
+        self.small_seat[tables], self.big_seat[tables] = small, big
+        for seat, amount in ((small, self.cost // 2), (big, self.cost)):
+            bal = self.bal[tables, seat]
+            all_in = bal <= amount
+            paid = np.where(all_in, bal, amount)
+            self.all_in[tables, seat] |= all_in
+            self.bal[tables, seat] = bal - paid
+            self.pot[tables] += paid
+        self.playing_i[tables] = (big_i + 1) % num_active
+
+    def _deal_board_card(self, tables):
+        """Burns a card and turns the next one, then reactivates players
+        who checked, as play_round does once every player has checked."""
+        card = self.deck[tables, self.next_card[tables] + 1]
+        self.board[tables, self.board_size[tables]] = card
+        self.next_card[tables] += 2
+        self.board_size[tables] += 1
+        status = self.status[tables]
+        status[status == CHECKED] = ACTIVE
+        self.status[tables] = status
+        self.round_cost[tables] = 0
+
+    def _execute(self, tables, seats, actions, amounts, blinds):
+        """Vectorized PokerGame.execute_action."""
+        bal = self.bal[tables, seats]
+        round_cost = self.round_cost[tables]
+        all_in = self.all_in[tables, seats] | (bal < round_cost) | \
+            (actions == ALL_IN)
+        check = actions == CHECK
+        raised = (actions == RAISE) | (actions == ALL_IN)
+        if not (check | raised | (actions == FOLD)).all():
+            raise ValueError("Unexpected player action")
+
+        amounts = np.where(all_in, bal, amounts)
+        if (raised & (amounts > bal)).any():
+            raise ValueError("Negative bal; player cannot go in debt")
+        check_paid = np.where(
+            all_in, bal, np.where(blinds == SMALL_BLIND, round_cost // 2,
+                                  np.where(blinds == BIG_BLIND, 0,
+                                           round_cost)))
+        paid = np.where(check, check_paid, np.where(raised, amounts, 0))
+
+        self.all_in[tables, seats] = all_in
+        self.bal[tables, seats] = bal - paid
+        self.pot[tables] += paid
+        self.round_cost[tables] += np.where(
+            raised, np.where(blinds == SMALL_BLIND,
+                             amounts - round_cost // 2, amounts), 0)
+
+        # A raise sends everyone still in the hand back to Active
+        status = self.status[tables]
+        rows = np.arange(len(tables))
+        reactivate = raised[:, None] & (status == CHECKED)
+        status[reactivate] = ACTIVE
+        status[rows, seats] = np.where(actions == FOLD, FOLDED, CHECKED)
+        self.status[tables] = status
+
+    def _bet(self, tables):
+        """Runs the betting loop of every table in `tables` to the end."""
+        while len(tables):
+            status = self.status[tables]
+            all_checked = ~(status == ACTIVE).any(axis=1)
+            board_full = self.board_size[tables] == MAX_CARDS_ON_TABLE
+            tables = tables[~(all_checked & board_full)]
+            deal = all_checked[~(all_checked & board_full)]
+            if deal.any():
+                self._deal_board_card(tables[deal])
+            if not len(tables):
+                break
+
+            status = self.status[tables]
+            in_hand = (status == ACTIVE) | (status == CHECKED)
+            seats = _kth_seat(in_hand, self.playing_i[tables])
+            preflop = self.board_size[tables] == 0
+            blinds = np.where(
+                preflop & (seats == self.small_seat[tables]), SMALL_BLIND,
+                np.where(preflop & (seats == self.big_seat[tables]),
+                         BIG_BLIND, NO_BLIND))
+
+            # All-in players check without deciding, as in Player.action
+            actions = np.full(len(tables), CHECK, np.int8)
+            amounts = np.zeros(len(tables), np.int64)
+            deciding = ~self.all_in[tables, seats]
+            if deciding.any():
+                actions[deciding], amounts[deciding] = self.policy(
+                    self, tables[deciding], seats[deciding])
+            self._execute(tables, seats, actions, amounts, blinds)
+
+            status = self.status[tables]
+            num_in_hand = ((status == ACTIVE) | (status == CHECKED)).sum(1)
+            self.playing_i[tables] = (self.playing_i[tables] + 1) % \
+                num_in_hand
+            tables = tables[num_in_hand > 1]
+
+    def _showdown(self, tables):
+        """Pays the pots of `tables` and returns their winner masks."""
+        status = self.status[tables]
+        in_hand = (status == ACTIVE) | (status == CHECKED)
+        ranks = np.where(in_hand, 0, np.iinfo(np.int32).max)
+
+        contested = in_hand.sum(axis=1) > 1
+        if contested.any():
+            rows, seats = np.nonzero(in_hand & contested[:, None])
+            t = tables[rows]
+            cards = np.concatenate((self.hole[t, seats], self.board[t]),
+                                   axis=1)
+            ranks[rows, seats] = evaluate_batch(cards)
+
+        winners = ranks == ranks.min(axis=1, keepdims=True)
+        num_winners = winners.sum(axis=1)
+        pot = self.pot[tables]
+        share, leftover = pot // num_winners, pot % num_winners
+        self.bal[tables] += winners * share[:, None]
+        lucky = _kth_seat(winners, self.rng.integers(num_winners))
+        self.bal[tables, lucky] += leftover
+        self.pot[tables] = 0
+        return winners
+
+    def _reset(self, tables):
+        self.round[tables] += 1
+        self.round_cost[tables] = self.cost
+        self.board[tables] = NO_CARD
+        self.board_size[tables] = 0
+        self.hole[tables] = NO_CARD
+        self.all_in[tables] = False
+        self.status[tables] = np.where(self.bal[tables] > 0, ACTIVE, INACTIVE)
+
+    def play_round(self, decks=None):
+        """
+        Plays one round at every live table. `decks` optionally gives each
+        table's deck order (a (num_tables, 52) array of card codes) instead
+        of a random shuffle. Returns the (T, P) mask of round winners.
+        """
+        tables = np.flatnonzero(self.get_live_tables())
+        winners = np.zeros((self.num_tables, self.num_players), bool)
+        if len(tables):
+            self._deal(tables, None if decks is None else
+                       np.asarray(decks, dtype=np.int8)[tables])
+            self._bet(tables)
+            winners[tables] = self._showdown(tables)
+            self._reset(tables)
+        self._checkrep()
+        return winners
+
+    def iterate_game(self, num_rounds=None):
+        """
+        Plays rounds until every table has a single player with money left
+        (or for `num_rounds` rounds) and returns the (T, P) mask of each
+        table's richest players.
+        """
+        played = 0
+        while self.get_live_tables().any():
+            if num_rounds is not None and played == num_rounds:
+                break
+            self.play_round()
+            played += 1
+        return self.get_winners()
+
+
+if __name__ == '__main__':
+    import time
+    for num_players in (3, 6, 14):
+        game = MultiTableGame(10 ** 4, num_players, 100, 20, seed=0)
+        start = time.perf_counter()
+        game.iterate_game(100)
+        elapsed = time.perf_counter() - start
+        print(f'{num_players} players: {10 ** 6 / elapsed:,.0f} '
+              f'table-rounds/s')
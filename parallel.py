@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Multi-process runners for hand distribution simulations and PokerGame
+tournaments. Every unit of work gets its own RNG stream spawned from a master
+seed: a chunk of decks per worker for simulations, so a run with a given seed
+and worker count is reproducible bit for bit, and a single game for
+run_games, so game results do not depend on the worker count at all.
+"""
+
+import os
+import random
+from multiprocessing import Pool
+
+import numpy as np
+
+from simulation import simulate_hand_distr, HAND_RANKINGS
+from utils import Player, PokerGame
+
+CHUNKS_PER_WORKER = 4
+
+
+def spawn_seeds(seed, num_workers):
+    """`num_workers` independent seed sequences (one per worker or per
+    game) derived from master `seed`."""
+    return np.random.SeedSequence(seed).spawn(num_workers)
+
+
+def split_work(total, num_workers):
+    """Splits `total` units of work into `num_workers` near-equal chunks."""
+    base, extra = divmod(total, num_workers)
+    return [base + (1 if i < extra else 0) for i in range(num_workers)]
+
+
+def _hand_distr_worker(args):
+    num_iters, exclude_high_card, batch_size, seed_seq = args
+    return simulate_hand_distr(num_iters, exclude_high_card,
+                               batch_size=batch_size, seed=seed_seq)
+
+
+def parallel_hand_distr(num_iters, exclude_high_card=False, num_workers=None,
+                        seed=None, batch_size=None):
+    """
+    Runs simulation.simulate_hand_distr over `num_iters` decks split across
+    `num_workers` processes (default: all cores) and merges the counters.
+    """
+    num_workers = os.cpu_count() if num_workers is None else num_workers
+    seeds = spawn_seeds(seed, num_workers)
+    tasks = [(chunk, exclude_high_card, batch_size, seed_seq)
+             for chunk, seed_seq in zip(split_work(num_iters, num_workers),
+                                        seeds)]
+    with Pool(num_workers) as pool:
+        results = pool.map(_hand_distr_worker, tasks)
+
+    counter = {hand: 0 for hand in HAND_RANKINGS}
+    for result in results:
+        for hand, count in result.items():
+            counter[hand] += count
+    return counter
+
+
+def play_tournament(num_players, bal, cost, num_rounds=None):
+    """Plays one PokerGame to completion (or for `num_rounds` rounds) and
+    returns the names of the winners."""
+    players = [Player(bal, f'Player {i}') for i in range(num_players)]
+    game = PokerGame(players, cost)
+    return {p.get_name() for p in game.iterate_game(num_rounds)}
+
+
+def _game_worker(args):
+    index, play_game, game_args, seed_seq = args
+    # PokerGame draws from the global random module, which is private to
+    # this worker process; reseeding per game makes chunking irrelevant
+    random.seed(int(seed_seq.generate_state(1)[0]))
+    return index, play_game(*game_args)
+
+
+def run_games(play_game, game_args, num_games, num_workers=None, seed=None,
+              chunksize=None):
+    """
+    Calls `play_game(*game_args)` (a module-level function) for `num_games`
+    games across `num_workers` processes (default: all cores) and returns
+    the results in game order. Each game is seeded from its own stream
+    spawned from `seed`, so results do not depend on the number of workers.
+    Games are sent to workers `chunksize` at a time (default: about 4 chunks
+    per worker) so that pool overhead stays small next to short games.
+    """
+    num_workers = os.cpu_count() if num_workers is None else num_workers
+    if chunksize is None:
+        chunksize = max(1, num_games // (num_workers * CHUNKS_PER_WORKER))
+    tasks = [(i, play_game, game_args, seed_seq)
+             for i, seed_seq in enumerate(spawn_seeds(seed, num_games))]
+    results = [None] * num_games
+    with Pool(num_workers) as pool:
+        for index, result in pool.imap_unordered(_game_worker, tasks,
+                                                 chunksize):
+            results[index] = result
+    return results
+
+
+def parallel_tournaments(num_games, num_players, bal, cost, num_rounds=None,
+                         num_workers=None, seed=None):
+    """
+    Plays `num_games` independent PokerGames of `num_players` players with
+    starting balance `bal` across `num_workers` processes. Returns the list
+    of winner name sets, in game order.
+    """
+    return run_games(play_tournament, (num_players, bal, cost, num_rounds),
+                     num_games, num_workers, seed)
+
+
+if __name__ == '__main__':
+    print(parallel_hand_distr(10 ** 6, seed=0))
+    print(parallel_tournaments(10, 14, 100, 20, seed=0))
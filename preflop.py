@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Precomputed preflop equities for the 169 starting-hand classes.
+
+A class is a pair (e.g. 'QQ'), a suited hand ('AKs') or an offsuit hand
+('AKo'). For hole cards of rank indices hi >= lo the class index is
+    pair:    13 * hi + hi
+    suited:  13 * hi + lo
+    offsuit: 13 * lo + hi
+which numbers the 169 classes 0-168 like the usual 13x13 starting-hand grid.
+
+The table holds the 169x169 heads-up equity matrix and the equity of every
+class against 1 to 13 random opponents. It is written to a compact binary
+file (a small header followed by float32 arrays) and looked up in O(1).
+"""
+
+import os
+import random
+import struct
+import sys
+from array import array
+from multiprocessing import Pool
+
+from equity import EquityEstimator
+from evaluator import evaluate
+from parallel import spawn_seeds
+from utils import CARDS_IN_A_DECK, MAX_NUM_PLAYERS, MAX_CARDS_ON_TABLE, \
+    to_codes, checkrep_policy
+
+NUM_RANKS = 13
+NUM_SUITS = 4
+NUM_CLASSES = NUM_RANKS * NUM_RANKS             # 169
+MAX_OPPONENTS = MAX_NUM_PLAYERS - 1             # 13
+MAGIC = b'PFEQ'
+VERSION = 1
+HEADER = struct.Struct('<4sHHH')
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), 'preflop.bin')
+RANK_CHARS = '23456789TJQKA'
+
+
+def hand_class(cards):
+    """Class index (0-168) of 2 hole cards given as Card objects or codes."""
+    a, b = to_codes(cards)
+    hi, lo = max(a >> 2, b >> 2), min(a >> 2, b >> 2)
+    if hi == lo or (a & 3) == (b & 3):
+        return NUM_RANKS * hi + lo
+    return NUM_RANKS * lo + hi
+
+
+def class_name(index):
+    """Name of a class, e.g. 'AA', 'AKs' or 'AKo'."""
+    row, col = divmod(index, NUM_RANKS)
+    if row == col:
+        return RANK_CHARS[row] * 2
+    if row > col:
+        return RANK_CHARS[row] + RANK_CHARS[col] + 's'
+    return RANK_CHARS[col] + RANK_CHARS[row] + 'o'
+
+
+def class_from_name(name):
+    """Class index of a name such as 'AA', 'AKs' or 'AKo'."""
+    hi, lo = RANK_CHARS.index(name[0]), RANK_CHARS.index(name[1])
+    if hi < lo:
+        raise ValueError(f"Higher rank must come first: {name}")
+    if hi == lo or name[2:] == 's':
+        return NUM_RANKS * hi + lo
+    return NUM_RANKS * lo + hi
+
+
+def class_combos(index):
+    """All concrete hole-card code pairs in a class (6, 4 or 12 of them)."""
+    row, col = divmod(index, NUM_RANKS)
+    hi, lo = max(row, col), min(row, col)
+    combos = []
+    for s1 in range(NUM_SUITS):
+        for s2 in range(NUM_SUITS):
+            a, b = NUM_SUITS * hi + s1, NUM_SUITS * lo + s2
+            if a == b or (hi == lo and s1 > s2):
+                continue
+            if (s1 == s2) == (row > col) or hi == lo:
+                combos.append((a, b))
+    return combos
+
+
+def _heads_up_equity(combos, other_combos, samples, rng):
+    """Monte Carlo equity of a random combo from `combos` against a random
+    non-conflicting combo from `other_combos` over random boards."""
+    deck = range(CARDS_IN_A_DECK)
+    total = 0.0
+    for i in range(samples):
+        hero = rng.choice(combos)
+        villain = rng.choice(other_combos)
+        while villain[0] in hero or villain[1] in hero:
+            villain = rng.choice(other_combos)
+        known = hero + villain
+        board = []
+        while len(board) < MAX_CARDS_ON_TABLE:
+            card = rng.choice(deck)
+            if card not in known and card not in board:
+                board.append(card)
+        hero_rank = evaluate(list(hero) + board)
+        villain_rank = evaluate(list(villain) + board)
+        if hero_rank < villain_rank:
+            total += 1.0
+        elif hero_rank == villain_rank:
+            total += 0.5
+    return total / samples
+
+
+def _row_worker(args):
+    index, samples, random_samples, seed_seq = args
+    rng = random.Random(int(seed_seq.generate_state(1)[0]))
+    combos = class_combos(index)
+
+    # Heads-up against every class at or after this one; the rest of the
+    # matrix follows from equity(j, i) = 1 - equity(i, j)
+    heads_up = [0.5 if other == index else
+                _heads_up_equity(combos, class_combos(other), samples, rng)
+                for other in range(index, NUM_CLASSES)]
+
+    # All combos of a class are equivalent against random hands
+    vs_random = []
+    for num_opponents in range(1, MAX_OPPONENTS + 1):
+        estimator = EquityEstimator(combos[0], num_opponents=num_opponents,
+                                    rng=rng)
+        estimator.run(random_samples)
+        vs_random.append(estimator.get_result().equity)
+    return heads_up, vs_random
+
+
+class PreflopTable():
+    """
+    Preflop equity lookup table.
+        heads_up (array): heads_up[169 * i + j] = equity of class i vs j
+        vs_random (array): vs_random[13 * i + n - 1] = equity of class i vs
+                           n random opponents
+
+    Rep invariant:
+        len(heads_up) == 169 * 169
+        len(vs_random) == 169 * 13
+        0 <= equity <= 1 for every entry
+    """
+
+    def __init__(self, heads_up, vs_random):
+        self.heads_up = heads_up
+        self.vs_random = vs_random
+        self._checkrep()
+
+    @checkrep_policy
+    def _checkrep(self):
+        assert len(self.heads_up) == NUM_CLASSES * NUM_CLASSES
+        assert len(self.vs_random) == NUM_CLASSES * MAX_OPPONENTS
+        assert all(0 <= e <= 1 for e in self.heads_up)
+        assert all(0 <= e <= 1 for e in self.vs_random)
+
+    def get_heads_up(self, hero_class, villain_class):
+        """Equity of class `hero_class` against class `villain_class`."""
+        return self.heads_up[NUM_CLASSES * hero_class + villain_class]
+
+    def get_vs_random(self, hero_class, num_opponents):
+        """Equity of class `hero_class` against `num_opponents` random
+        hands."""
+        return self.vs_random[MAX_OPPONENTS * hero_class + num_opponents - 1]
+
+    def lookup(self, hole_cards, num_opponents=1):
+        """Equity of concrete hole cards against random opponents."""
+        return self.get_vs_random(hand_class(hole_cards), num_opponents)
+
+    def save(self, path=DEFAULT_PATH):
+        heads_up, vs_random = array('f', self.heads_up), \
+            array('f', self.vs_random)
+        if sys.byteorder != 'little':
+            heads_up.byteswap()
+            vs_random.byteswap()
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, NUM_CLASSES, MAX_OPPONENTS))
+            heads_up.tofile(f)
+            vs_random.tofile(f)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        heads_up, vs_random = array('f'), array('f')
+        with open(path, 'rb') as f:
+            magic, version, num_classes, max_opponents = \
+                HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"Not a preflop equity table: {path}")
+            heads_up.fromfile(f, num_classes * num_classes)
+            vs_random.fromfile(f, num_classes * max_opponents)
+        if sys.byteorder != 'little':
+            heads_up.byteswap()
+            vs_random.byteswap()
+        return cls(heads_up, vs_random)
+
+
+def generate_table(samples=1000, random_samples=None, num_workers=None,
+                   seed=None):
+    """
+    Computes a PreflopTable with `samples` Monte Carlo showdowns per
+    heads-up class matchup and `random_samples` (default `samples`) per
+    class and opponent count, one class per task across `num_workers`
+    processes. A given seed reproduces the table exactly.
+    """
+    random_samples = samples if random_samples is None else random_samples
+    num_workers = os.cpu_count() if num_workers is None else num_workers
+    tasks = [(index, samples, random_samples, seed_seq)
+             for index, seed_seq in enumerate(spawn_seeds(seed, NUM_CLASSES))]
+    with Pool(num_workers) as pool:
+        rows = pool.map(_row_worker, tasks)
+
+    heads_up = array('f', [0.0] * (NUM_CLASSES * NUM_CLASSES))
+    vs_random = array('f')
+    for index, (row, row_vs_random) in enumerate(rows):
+        for offset, value in enumerate(row):
+            other = index + offset
+            heads_up[NUM_CLASSES * index + other] = value
+            heads_up[NUM_CLASSES * other + index] = 1.0 - value
+        vs_random.extend(row_vs_random)
+    return PreflopTable(heads_up, vs_random)
+
+
+if __name__ == '__main__':
+    table = generate_table(seed=0)
+    table.save()
+    for name in ('AA', 'AKs', '72o'):
+        index = class_from_name(name)
+        print(name, [round(table.get_vs_random(index, n), 3)
+                     for n in range(1, MAX_OPPONENTS + 1)])
@@ -1,10 +1,26 @@
 #!/usr/bin/env python3
 
-import random
-import matplotlib.pyplot as plt
-from utils import Hand, Deck  # , Card, Player, PokerGame
+import time
+from collections import Counter
+from itertools import combinations_with_replacement
+from math import comb, prod
 
+import numpy as np
+
+from evaluator import evaluate5, rank_category_index
+
+CARDS_IN_A_DECK = 52
 CARDS_IN_A_HAND = 5
+HANDS_PER_DECK = 10
+NUM_RANKS = 13
+NUM_SUITS = 4
+TOTAL_HANDS = comb(CARDS_IN_A_DECK, CARDS_IN_A_HAND)   # 2,598,960
+DEFAULT_BATCH_SIZE = 100000                 # Decks dealt per vectorized batch
+DEFAULT_SNAPSHOT_DECKS = 10 ** 6            # Decks between stream snapshots
+NUM_STRAIGHTS = 10                          # Wheel (A-5) up to broadway
+MIN_STRATUM_HANDS = 2                       # Hands per rank pattern
+# Share of importance samples drawn uniformly, suited, connected and both
+IMPORTANCE_MIXTURE = (0.4, 0.2, 0.2, 0.2)
 ROYAL_FLUSH_VALS = set(['A', 'K', 'Q', 'J', 10])
 VALS_MAPPING = {2: 2, 3: 3, 4: 4, 5: 5, 6: 6,
                 7: 7, 8: 8, 9: 9, 10: 10, 'J': 11,
@@ -13,33 +29,401 @@ HAND_RANKINGS = ['royal flush', 'straight flush', 'four of a kind',
                  'full house', 'flush', 'straight', 'three of a kind',
                  'two pair', 'one pair', 'high card']
 
+# Category of a hand with repeated ranks, indexed by the 4-bit pattern of
+# equal neighbours in its sorted ranks (bit i set if ranks[i] == ranks[i + 1])
+_PAIRING_CATEGORY = np.full(16, HAND_RANKINGS.index('high card'), np.int8)
+for _pattern in (0b0001, 0b0010, 0b0100, 0b1000):
+    _PAIRING_CATEGORY[_pattern] = HAND_RANKINGS.index('one pair')
+for _pattern in (0b0101, 0b1001, 0b1010):
+    _PAIRING_CATEGORY[_pattern] = HAND_RANKINGS.index('two pair')
+for _pattern in (0b0011, 0b0110, 0b1100):
+    _PAIRING_CATEGORY[_pattern] = HAND_RANKINGS.index('three of a kind')
+for _pattern in (0b1011, 0b1101):
+    _PAIRING_CATEGORY[_pattern] = HAND_RANKINGS.index('full house')
+for _pattern in (0b0111, 0b1110):
+    _PAIRING_CATEGORY[_pattern] = HAND_RANKINGS.index('four of a kind')
+
+
+def classify_hands(hands):
+    """
+    Vectorized hand classification. `hands` is an (n, 5) integer array of
+    card codes (code = 4 * rank + suit, see utils.encode_card). Returns an
+    array of n indices into HAND_RANKINGS.
+    """
+    ranks = np.sort(hands >> 2, axis=1)
+    suits = hands & 3
+
+    equal = ranks[:, 1:] == ranks[:, :-1]
+    pattern = equal @ (1 << np.arange(CARDS_IN_A_HAND - 1))
+    categories = _PAIRING_CATEGORY[pattern]
+
+    distinct = pattern == 0
+    flush = (suits == suits[:, :1]).all(axis=1)
+    wheel = (ranks == [0, 1, 2, 3, 12]).all(axis=1)
+    straight = distinct & ((ranks[:, 4] - ranks[:, 0] == 4) | wheel)
+    royal = straight & flush & (ranks[:, 0] == 8)
+
+    categories[distinct & flush] = HAND_RANKINGS.index('flush')
+    categories[straight & ~flush] = HAND_RANKINGS.index('straight')
+    categories[straight & flush] = HAND_RANKINGS.index('straight flush')
+    categories[royal] = HAND_RANKINGS.index('royal flush')
+    return categories
+
+
+def deal_hands(num_decks, rng):
+    """Shuffles `num_decks` decks and deals 10 5-card hands from each, as a
+    (10 * num_decks, 5) array of card codes."""
+    decks = np.tile(np.arange(CARDS_IN_A_DECK, dtype=np.int8), (num_decks, 1))
+    decks = rng.permuted(decks, axis=1)
+    dealt = decks[:, :HANDS_PER_DECK * CARDS_IN_A_HAND]
+    return dealt.reshape(num_decks * HANDS_PER_DECK, CARDS_IN_A_HAND)
+
+
+def _to_counter(totals, exclude_high_card):
+    counter = {}
+    for i, hand in enumerate(HAND_RANKINGS):
+        counter[hand] = int(totals[i])
+    if exclude_high_card:
+        counter['high card'] = 0
+    return counter
+
 
-def simulate_hand_distr(num_iters, exclude_high_card=False):
-    # Initialize the counting dictionary
+def stream_hand_distr(num_iters=None, exclude_high_card=False,
+                      snapshot_every=DEFAULT_SNAPSHOT_DECKS, batch_size=None,
+                      seed=None):
+    """
+    Generator form of simulate_hand_distr: deals `num_iters` decks (forever
+    if None) and yields a snapshot dict every `snapshot_every` decks and at
+    the end:
+        decks, hands (int): totals dealt so far
+        counter (dict): running count of each hand type
+        frequencies (dict): running fraction of hands of each type
+        hands_per_sec (float): throughput since the previous snapshot
+    Memory use is constant; stop iterating (or close()) to cancel.
+    """
+    batch_size = DEFAULT_BATCH_SIZE if batch_size is None else batch_size
+    batch_size = min(batch_size, snapshot_every)
+    rng = np.random.default_rng(seed)
+
+    totals = np.zeros(len(HAND_RANKINGS), dtype=np.int64)
+    decks = since_snapshot = 0
+    last_time = time.perf_counter()
+    while num_iters is None or decks < num_iters:
+        num_decks = batch_size if num_iters is None else \
+            min(batch_size, num_iters - decks)
+        num_decks = min(num_decks, snapshot_every - since_snapshot)
+        categories = classify_hands(deal_hands(num_decks, rng))
+        totals += np.bincount(categories, minlength=len(HAND_RANKINGS))
+        decks += num_decks
+        since_snapshot += num_decks
+
+        if since_snapshot == snapshot_every or decks == num_iters:
+            now = time.perf_counter()
+            hands = decks * HANDS_PER_DECK
+            counter = _to_counter(totals, exclude_high_card)
+            yield {'decks': decks, 'hands': hands, 'counter': counter,
+                   'frequencies': {h: c / hands for h, c in counter.items()},
+                   'hands_per_sec': since_snapshot * HANDS_PER_DECK /
+                   max(now - last_time, 1e-9)}
+            since_snapshot, last_time = 0, now
+
+
+def simulate_hand_distr(num_iters, exclude_high_card=False, batch_size=None,
+                        seed=None):
+    """
+    Shuffles `num_iters` decks, deals 10 hands from each and returns the
+    number of hands of each type in HAND_RANKINGS. Decks are dealt and
+    classified `batch_size` at a time as NumPy arrays; `seed` seeds the
+    generator for reproducible runs.
+    """
+    if num_iters <= 0:
+        return _to_counter(np.zeros(len(HAND_RANKINGS)), exclude_high_card)
+
+    # Single snapshot at the end of the run
+    for snapshot in stream_hand_distr(num_iters, exclude_high_card,
+                                      snapshot_every=num_iters,
+                                      batch_size=batch_size, seed=seed):
+        pass
+    return snapshot['counter']
+
+
+def exact_hand_distr(exclude_high_card=False):
+    """
+    Exact number of hands of each type in HAND_RANKINGS among all 2,598,960
+    5-card hands. Enumerates the 6,175 rank patterns and counts the suit
+    assignments of each instead of the hands themselves.
+    """
     counter = {}
-    total_hands = 0
     for hand in HAND_RANKINGS:
         counter[hand] = 0
 
-    # Iterate and collect count of each hand type
-    for i in range(num_iters):
-        deck = Deck()
-        deck.shuffle()
-        for j in range(10):
-            cards = deck.draw(5)
-            hand = Hand(cards)
-            hand_type = hand.get_best_hand()
-            total_hands += 1
-            if exclude_high_card and hand_type == 'high card':
-                continue
-            counter[hand_type] += 1
+    for ranks in combinations_with_replacement(range(NUM_RANKS), 5):
+        counts = Counter(ranks)
+        if max(counts.values()) > NUM_SUITS:
+            continue
 
+        # Representative hand: the i-th card of a rank gets suit i
+        codes = []
+        for rank, cnt in counts.items():
+            codes += [NUM_SUITS * rank + suit for suit in range(cnt)]
+        ways = prod(comb(NUM_SUITS, cnt) for cnt in counts.values())
+
+        if len(counts) == CARDS_IN_A_HAND:
+            # Distinct ranks: NUM_SUITS of the suit assignments are flushes,
+            # the rest are represented by moving one card off the flush suit
+            category = rank_category_index(evaluate5(codes))
+            counter[HAND_RANKINGS[category]] += NUM_SUITS
+            ways -= NUM_SUITS
+            codes[0] += 1
+        category = rank_category_index(evaluate5(codes))
+        counter[HAND_RANKINGS[category]] += ways
+
+    if exclude_high_card:
+        counter['high card'] = 0
     return counter
 
 
+def _batch_sizes(num, batch_size):
+    while num > 0:
+        yield min(batch_size, num)
+        num -= batch_size
+
+
+def _one_hot(categories):
+    return np.eye(len(HAND_RANKINGS))[categories]
+
+
+def _mean_and_se(total, total_sq, n):
+    """Means and standard errors of the means of n samples, given their
+    sums and sums of squares."""
+    mean = total / n
+    var = np.maximum(total_sq / n - mean ** 2, 0) * n / max(n - 1, 1)
+    return mean, np.sqrt(var / n)
+
+
+def _uniform_hands(num_hands, rng, antithetic=False):
+    """
+    (num_hands, 5) array of independent uniformly random hands: the cards
+    with the 5 lowest of 52 uniform keys. If `antithetic`, also returns the
+    hands of the 5 highest keys, i.e. the hands drawn with keys 1 - U.
+    """
+    keys = rng.random((num_hands, CARDS_IN_A_DECK))
+    kth = CARDS_IN_A_HAND, CARDS_IN_A_DECK - CARDS_IN_A_HAND - 1
+    order = np.argpartition(keys, kth if antithetic else kth[0], axis=1)
+    if antithetic:
+        return order[:, :CARDS_IN_A_HAND], order[:, -CARDS_IN_A_HAND:]
+    return order[:, :CARDS_IN_A_HAND]
+
+
+def _estimate_plain(num_hands, batch_size, rng):
+    total = np.zeros(len(HAND_RANKINGS))
+    for n in _batch_sizes(num_hands, batch_size):
+        total += np.bincount(classify_hands(_uniform_hands(n, rng)),
+                             minlength=len(HAND_RANKINGS))
+    # Indicator samples: the sum of squares is the sum
+    return num_hands, _mean_and_se(total, total, num_hands)
+
+
+def _estimate_antithetic(num_hands, batch_size, rng):
+    num_pairs = max(num_hands // 2, 1)
+    total = np.zeros(len(HAND_RANKINGS))
+    total_sq = np.zeros(len(HAND_RANKINGS))
+    for n in _batch_sizes(num_pairs, batch_size):
+        hands, partners = _uniform_hands(n, rng, antithetic=True)
+        pairs = (_one_hot(classify_hands(hands)) +
+                 _one_hot(classify_hands(partners))) / 2
+        total += pairs.sum(axis=0)
+        total_sq += (pairs ** 2).sum(axis=0)
+    return 2 * num_pairs, _mean_and_se(total, total_sq, num_pairs)
+
+
+def _rank_strata():
+    """
+    The rank patterns (sorted 5-rank multisets) as an (S, 5) array, the
+    index of each card among the cards of its rank, and the probability of
+    each pattern.
+    """
+    ranks, weights = [], []
+    for multiset in combinations_with_replacement(range(NUM_RANKS),
+                                                  CARDS_IN_A_HAND):
+        counts = Counter(multiset)
+        if max(counts.values()) <= NUM_SUITS:
+            ranks.append(multiset)
+            weights.append(prod(comb(NUM_SUITS, c) for c in counts.values()))
+    ranks = np.array(ranks)
+    copy = np.zeros_like(ranks)
+    for j in range(1, CARDS_IN_A_HAND):
+        copy[:, j] = np.where(ranks[:, j] == ranks[:, j - 1],
+                              copy[:, j - 1] + 1, 0)
+    return ranks, copy, np.array(weights) / TOTAL_HANDS
+
+
+def _estimate_stratified(num_hands, batch_size, rng):
+    ranks, copy, weights = _rank_strata()
+    num_strata, num_categories = len(weights), len(HAND_RANKINGS)
+    sizes = np.maximum(np.rint(num_hands * weights).astype(np.int64),
+                       MIN_STRATUM_HANDS)
+    ends = np.cumsum(sizes)
+
+    counts = np.zeros(num_strata * num_categories, np.int64)
+    start = 0
+    for n in _batch_sizes(int(ends[-1]), batch_size):
+        strata = np.searchsorted(ends, np.arange(start, start + n),
+                                 side='right')
+        start += n
+        # Copies of a rank take distinct suits from a random permutation
+        # drawn at the rank's first card
+        perms = np.argsort(rng.random((n, CARDS_IN_A_HAND, NUM_SUITS)),
+                           axis=2)
+        slot, copies = np.arange(CARDS_IN_A_HAND), copy[strata]
+        suits = perms[np.arange(n)[:, None], slot - copies, copies]
+        categories = classify_hands(NUM_SUITS * ranks[strata] + suits)
+        counts += np.bincount(strata * num_categories + categories,
+                              minlength=num_strata * num_categories)
+
+    counts = counts.reshape(num_strata, num_categories)
+    sizes = sizes[:, None]
+    var = (counts - counts ** 2 / sizes) / (sizes - 1)
+    return int(ends[-1]), (weights @ (counts / sizes),
+                           np.sqrt((weights[:, None] ** 2 / sizes *
+                                    var).sum(axis=0)))
+
+
+def _suited_connected(categories):
+    """Whether each hand is suited (all one suit) and connected (a
+    straight's ranks), from its category."""
+    categories = np.asarray(categories)
+    straight_flush = categories <= HAND_RANKINGS.index('straight flush')
+    suited = straight_flush | (categories == HAND_RANKINGS.index('flush'))
+    connected = straight_flush | \
+        (categories == HAND_RANKINGS.index('straight'))
+    return suited, connected
+
+
+def _estimate_importance(num_hands, batch_size, rng):
+    num_categories = len(HAND_RANKINGS)
+    mixture = np.array(IMPORTANCE_MIXTURE)
+    # Number of hands each component draws from, uniformly
+    support = np.array([TOTAL_HANDS, NUM_SUITS * comb(NUM_RANKS, 5),
+                        NUM_STRAIGHTS * NUM_SUITS ** CARDS_IN_A_HAND,
+                        NUM_STRAIGHTS * NUM_SUITS])
+    total = np.zeros(num_categories)
+    total_sq = np.zeros(num_categories)
+    for n in _batch_sizes(num_hands, batch_size):
+        component = rng.choice(len(mixture), size=n, p=mixture)
+        hands = _uniform_hands(n, rng)
+
+        # Suited components: 5 distinct ranks (or a straight), one suit
+        suited = component % 2 == 1
+        connected = component >= 2
+        ranks = np.argpartition(rng.random((n, NUM_RANKS)), 5,
+                                axis=1)[:, :CARDS_IN_A_HAND]
+        low = rng.integers(NUM_STRAIGHTS, size=n)[:, None] - 1
+        ranks = np.where(connected[:, None],
+                         (low + np.arange(CARDS_IN_A_HAND)) % NUM_RANKS,
+                         ranks)
+        suits = np.where(suited[:, None],
+                         rng.integers(NUM_SUITS, size=n)[:, None],
+                         rng.integers(NUM_SUITS, size=(n, CARDS_IN_A_HAND)))
+        hands = np.where((component > 0)[:, None],
+                         NUM_SUITS * ranks + suits, hands)
+
+        # Likelihood ratio of the uniform distribution to the mixture
+        categories = classify_hands(hands)
+        is_suited, is_connected = _suited_connected(categories)
+        member = np.stack([np.ones(n, bool), is_suited, is_connected,
+                           is_suited & is_connected], axis=1)
+        density = (member * (mixture / support)).sum(axis=1)
+        samples = _one_hot(categories) / (TOTAL_HANDS * density)[:, None]
+        total += samples.sum(axis=0)
+        total_sq += (samples ** 2).sum(axis=0)
+    return num_hands, _mean_and_se(total, total_sq, num_hands)
+
+
+def _estimate_control(num_hands, batch_size, rng):
+    num_categories = len(HAND_RANKINGS)
+    # Exact means of the controls: suited, connected, both
+    control_means = np.array([NUM_SUITS * comb(NUM_RANKS, 5),
+                              NUM_STRAIGHTS * NUM_SUITS ** CARDS_IN_A_HAND,
+                              NUM_STRAIGHTS * NUM_SUITS]) / TOTAL_HANDS
+    sum_x, sum_y = np.zeros(3), np.zeros(num_categories)
+    sum_xx, sum_xy = np.zeros((3, 3)), np.zeros((3, num_categories))
+    for n in _batch_sizes(num_hands, batch_size):
+        categories = classify_hands(_uniform_hands(n, rng))
+        suited, connected = _suited_connected(categories)
+        x = np.stack([suited, connected, suited & connected],
+                     axis=1).astype(float)
+        y = _one_hot(categories)
+        sum_x += x.sum(axis=0)
+        sum_y += y.sum(axis=0)
+        sum_xx += x.T @ x
+        sum_xy += x.T @ y
+
+    # Regress each category's indicator on the controls and subtract the
+    # controls' deviation from their exact means
+    mean_x, mean_y = sum_x / num_hands, sum_y / num_hands
+    cov_xx = sum_xx / num_hands - np.outer(mean_x, mean_x)
+    cov_xy = sum_xy / num_hands - np.outer(mean_x, mean_y)
+    beta = np.linalg.pinv(cov_xx) @ cov_xy
+    estimate = mean_y - (mean_x - control_means) @ beta
+    var = mean_y * (1 - mean_y) - (cov_xy * beta).sum(axis=0)
+    return num_hands, (estimate,
+                       np.sqrt(np.maximum(var, 0) / max(num_hands - 1, 1)))
+
+
+_ESTIMATORS = {'plain': _estimate_plain,
+               'stratified': _estimate_stratified,
+               'importance': _estimate_importance,
+               'antithetic': _estimate_antithetic,
+               'control': _estimate_control}
+ESTIMATOR_MODES = tuple(_ESTIMATORS)
+
+
+def estimate_hand_distr(num_hands, mode='plain', batch_size=None, seed=None):
+    """
+    Estimates the probability of each hand type in HAND_RANKINGS from about
+    `num_hands` independent random hands, with standard errors. `mode` is
+    one of ESTIMATOR_MODES:
+        plain: uniform hands, as in simulate_hand_distr
+        stratified: a fixed share of the hands for each rank pattern,
+                    proportional to its probability (at least 2), with
+                    random suits; pairing categories and straights come
+                    out almost exact
+        importance: hands drawn from a mixture of uniform, suited,
+                    connected and suited-connected hands
+                    (IMPORTANCE_MIXTURE), reweighted by likelihood ratio;
+                    for flushes, straights and straight/royal flushes
+        antithetic: pairs of hands from the lowest and highest of the same
+                    uniform keys
+        control: uniform hands, with the suited, connected and
+                 suited-connected indicators (of known mean) as control
+                 variates
+    Returns a dict with
+        mode (str), hands (int): mode and number of hands dealt
+        frequencies (dict): estimated probability of each hand type
+        std_errors (dict): standard error of each estimate, estimated from
+                           the samples, so unreliable for categories (or
+                           controls) with few hits
+    """
+    if mode not in _ESTIMATORS:
+        raise ValueError(f"Unknown estimator mode: {mode}")
+    if num_hands <= 0:
+        raise ValueError("num_hands must be positive")
+    batch_size = DEFAULT_BATCH_SIZE if batch_size is None else batch_size
+    rng = np.random.default_rng(seed)
+    hands, (freqs, errors) = _ESTIMATORS[mode](num_hands, batch_size, rng)
+    return {'mode': mode, 'hands': hands,
+            'frequencies': dict(zip(HAND_RANKINGS, freqs.tolist())),
+            'std_errors': dict(zip(HAND_RANKINGS, errors.tolist()))}
+
+
 if __name__ == '__main__':
-    data = simulate_hand_distr(100, True)
-    names, vals = data.keys(), [v / 1000.0 for v in data.values()]
+    import matplotlib.pyplot as plt
+
+    num_iters = 10 ** 6
+    data = simulate_hand_distr(num_iters, True)
+    total_hands = num_iters * HANDS_PER_DECK
+    names, vals = data.keys(), [v / total_hands for v in data.values()]
 
     fig, ax = plt.subplots(figsize=(16, 9))
     ax.bar(names, vals, color='maroon', width=0.5)
@@ -61,6 +445,6 @@ if __name__ == '__main__':
 
     # Add labels and title
     plt.xlabel('Type of Hand')
-    plt.ylabel('Number of Occurrences')
+    plt.ylabel('Frequency')
     plt.title('Poker Hand Distribution')
     plt.show()
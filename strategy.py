@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Strategy interface.
+
+A strategy decides either a single Decision, the plain-Python state
+Player.action builds for each turn, or a batch of DecisionStates (one per
+pending decision, e.g. one per table of a MultiTableGame), returning one
+action code and amount per decision. Batches pay per-call overhead once per
+batch rather than once per decision. numpy is only imported once a batch is
+used (see _LazyNumpy), so single decisions stay cheap. Strategies are registered by name in
+Player.strategies.
+"""
+
+import random
+from importlib import import_module
+
+from checkrep import checkrep_policy
+
+STARTING_NUM_CARDS = 2
+MAX_CARDS_ON_TABLE = 5
+NO_CARD = -1
+DEFAULT_RAISE = 10
+
+# Action codes; ALL_IN is a raise of the whole stack
+FOLD, CHECK, RAISE, ALL_IN = range(4)
+ACTIONS = ('Fold', 'Check', 'Raise', 'All-in')
+
+
+class _LazyNumpy():
+    """Stands in for the numpy module until the first attribute access,
+    which imports numpy and replaces this module's `np` with it."""
+
+    def __getattr__(self, name):
+        import numpy
+        globals()['np'] = numpy
+        return getattr(numpy, name)
+
+
+np = _LazyNumpy()
+
+
+class Decision():
+    """
+    A single decision, with the fields of one DecisionState row as plain
+    Python values:
+        hole (tuple): the acting player's hole card codes, fewer than 2 if
+                      they have not been fully dealt
+        board (tuple): board card codes
+        pot, round_cost, stack: int or float amounts, kept as given
+        position, num_players (int) and all_in (bool)
+
+    Rep invariant:
+        len(hole) <= 2, len(board) <= 5
+        stack >= 0, pot >= 0, round_cost >= 0
+        1 <= num_players
+    """
+
+    __slots__ = ('hole', 'board', 'pot', 'round_cost', 'stack', 'position',
+                 'num_players', 'all_in')
+
+    def __init__(self, hole, board, pot, round_cost, stack, position,
+                 num_players, all_in=False):
+        self.hole = tuple(hole)
+        self.board = tuple(board)
+        self.pot = pot
+        self.round_cost = round_cost
+        self.stack = stack
+        self.position = position
+        self.num_players = num_players
+        self.all_in = all_in
+        self._checkrep()
+
+    @checkrep_policy
+    def _checkrep(self):
+        assert len(self.hole) <= STARTING_NUM_CARDS
+        assert len(self.board) <= MAX_CARDS_ON_TABLE
+        assert self.stack >= 0
+        assert self.pot >= 0
+        assert self.round_cost >= 0
+        assert self.num_players >= 1
+
+    @property
+    def board_size(self):
+        return len(self.board)
+
+
+class DecisionState():
+    """
+    A batch of n decisions, each field an array with one entry per
+    decision:
+        hole (n, 2): the acting player's hole card codes, NO_CARD for cards
+                     not dealt yet
+        board (n, 5): board card codes, NO_CARD past board_size
+        board_size (n): number of board cards out
+        pot (n): money in the pot
+        round_cost (n): the game's current round_cost
+        stack (n): the acting player's balance
+        position (n): seat relative to the small blind among the players
+                      dealt in (0 = small blind, 1 = big blind, ...)
+        num_players (n): players still in the hand, the actor included
+        all_in (n): whether the acting player is already all-in
+    Card and count fields are int64; pot, round_cost and stack keep the
+    numeric type they are given (float64 if any amount is a float).
+
+    Rep invariant:
+        all fields have n rows
+        0 <= board_size <= 5
+        stack >= 0, pot >= 0, round_cost >= 0
+        1 <= num_players
+    """
+
+    def __init__(self, hole, board, pot, round_cost, stack, position,
+                 num_players, all_in=None):
+        self.hole = np.asarray(hole, dtype=np.int64).reshape(
+            -1, STARTING_NUM_CARDS)
+        n = len(self.hole)
+        board = np.asarray(board, dtype=np.int64).reshape(n, -1)
+        self.board = np.full((n, MAX_CARDS_ON_TABLE), NO_CARD, np.int64)
+        self.board[:, :board.shape[1]] = board
+        self.board_size = (self.board != NO_CARD).sum(axis=1)
+        self.pot = np.asarray(pot).reshape(n)
+        self.round_cost = np.asarray(round_cost).reshape(n)
+        self.stack = np.asarray(stack).reshape(n)
+        self.position = np.asarray(position, dtype=np.int64).reshape(n)
+        self.num_players = np.asarray(num_players, dtype=np.int64).reshape(n)
+        self.all_in = np.zeros(n, bool) if all_in is None else \
+            np.asarray(all_in, dtype=bool).reshape(n)
+        self._checkrep()
+
+    @classmethod
+    def from_decisions(cls, decisions):
+        """Batch of the single Decisions in `decisions`."""
+        def padded(cards, size):
+            return cards + (NO_CARD,) * (size - len(cards))
+        return cls([padded(d.hole, STARTING_NUM_CARDS) for d in decisions],
+                   [padded(d.board, MAX_CARDS_ON_TABLE) for d in decisions],
+                   [d.pot for d in decisions],
+                   [d.round_cost for d in decisions],
+                   [d.stack for d in decisions],
+                   [d.position for d in decisions],
+                   [d.num_players for d in decisions],
+                   [d.all_in for d in decisions])
+
+    @checkrep_policy
+    def _checkrep(self):
+        n = len(self.hole)
+        for field in (self.board, self.board_size, self.pot, self.round_cost,
+                      self.stack, self.position, self.num_players,
+                      self.all_in):
+            assert len(field) == n
+        assert ((self.board_size >= 0) &
+                (self.board_size <= MAX_CARDS_ON_TABLE)).all()
+        assert (self.stack >= 0).all()
+        assert (self.pot >= 0).all()
+        assert (self.round_cost >= 0).all()
+        assert (self.num_players >= 1).all()
+
+    def __len__(self):
+        return len(self.hole)
+
+
+class Strategy():
+    """
+    Base class of strategies. Subclasses implement decide_batch, returning
+    for a DecisionState of n decisions an array of n action codes (FOLD,
+    CHECK, RAISE or ALL_IN) and an array of n raise amounts (ignored for
+    other actions). They may also override decide, which by default decides
+    a single Decision as a batch of one.
+    """
+
+    def decide(self, state):
+        """(action code, raise amount) for the single Decision `state`."""
+        actions, amounts = self.decide_batch(
+            DecisionState.from_decisions([state]))
+        return int(actions[0]), amounts[0].item()
+
+    def decide_batch(self, states):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f'{type(self).__name__}()'
+
+
+class RandomStrategy(Strategy):
+    """
+    Reference strategy: picks fold, check, raise or all-in uniformly at
+    random, raising `raise_amount` (or the whole stack if less). Draws from
+    `rng` (default: the global random module, like PokerGame).
+    """
+
+    def __init__(self, raise_amount=DEFAULT_RAISE, rng=None):
+        self.raise_amount = raise_amount
+        self.rng = random if rng is None else rng
+
+    def decide(self, state):
+        return self.rng.randrange(len(ACTIONS)), \
+            min(self.raise_amount, state.stack)
+
+    def decide_batch(self, states):
+        randrange = self.rng.randrange
+        actions = np.array([randrange(len(ACTIONS))
+                            for i in range(len(states))], dtype=np.int8)
+        return actions, np.minimum(self.raise_amount, states.stack)
+
+
+class CheckStrategy(Strategy):
+    """Always checks: calls every round cost and never raises or folds."""
+
+    def decide(self, state):
+        return CHECK, 0
+
+    def decide_batch(self, states):
+        return np.full(len(states), CHECK, np.int8), \
+            np.zeros(len(states), np.int64)
+
+
+class LazyStrategy(Strategy):
+    """
+    Stands in for the strategy class `class_name` of module `module_name`,
+    which is imported and instantiated on the first decision. Lets
+    Player.strategies register strategies whose modules import utils.
+    """
+
+    def __init__(self, module_name, class_name):
+        self.module_name = module_name
+        self.class_name = class_name
+        self.strategy = None
+
+    def get_strategy(self):
+        """The underlying strategy instance, created on first use."""
+        if self.strategy is None:
+            module = import_module(self.module_name)
+            self.strategy = getattr(module, self.class_name)()
+        return self.strategy
+
+    def decide(self, state):
+        return self.get_strategy().decide(state)
+
+    def decide_batch(self, states):
+        return self.get_strategy().decide_batch(states)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.module_name!r}, ' + \
+            f'{self.class_name!r})'
@@ -1,11 +1,34 @@
 #!/usr/bin/env python3
 
 import os
+import pickle
+import subprocess
+import sys
+import utils
 import pytest
 # import sys
 # import copy
 
-from utils import Card, Hand, Deck, Player, PokerGame
+from utils import Card, Hand, BitHand, Deck, Player, PokerGame
+from utils import CARDS_IN_A_DECK, encode_card, decode_card, to_codes
+from utils import set_checkrep_policy, get_checkrep_policy
+from utils import load_checkrep_policy, get_checkrep_calls, GameStats
+from evaluator import evaluate, evaluate5, rank_category, WORST_RANK
+from evaluator import RankCache
+import numpy as np
+import simulation
+import parallel
+import random
+import time
+from equity import equity, EquityEstimator, EquityStrategy
+import preflop
+import isomorphism
+from itertools import combinations
+import benchmark
+import tournament
+import history
+import multitable
+import strategy
 
 TEST_DIRECTORY = os.path.dirname(__file__)
 
@@ -219,6 +242,629 @@ def test_equality(royal_flush_hand, high_card_hand):
     assert high_hand2 < royal_flush_hand
 
 
+def test_bithand_matches_hand(royal_flush_hand, straight_flush_hand,
+                              four_of_a_kind_hand, full_house_hand,
+                              flush_hand, straight_hand, three_of_a_kind_hand,
+                              two_pair_hand, one_pair_hand, high_card_hand):
+    hands = [royal_flush_hand, straight_flush_hand, four_of_a_kind_hand,
+             full_house_hand, flush_hand, straight_hand, three_of_a_kind_hand,
+             two_pair_hand, one_pair_hand, high_card_hand]
+    deck = Deck()
+    deck.shuffle()
+    for i in range(500):
+        if deck.get_num_cards() < 5:
+            deck.reset()
+            deck.shuffle()
+        hands.append(Hand(deck.draw(5)))
+
+    for hand in hands:
+        bit_hand = BitHand(hand.get_cards())
+        for name, checker in Hand.checkers.items():
+            assert checker(bit_hand) == checker(hand), name
+        assert bit_hand.get_best_hand_by_checkers() == hand.get_best_hand()
+        assert bit_hand.get_sorted() == hand.get_sorted()
+        assert bit_hand.get_rank() == hand.get_rank()
+        assert bit_hand == hand
+
+
+def test_rank_cached(monkeypatch):
+    deck = Deck()
+    deck.shuffle()
+    hands = [Hand(deck.draw_codes(5)) for i in range(10)]
+    calls = []
+    evaluate5 = utils.evaluate5
+    monkeypatch.setattr(utils, 'evaluate5',
+                        lambda codes: calls.append(codes) or evaluate5(codes))
+    by_compare = sorted(hands, reverse=True)
+    assert len(calls) == len(hands)
+    by_key = sorted(hands, key=Hand.get_rank)
+    assert [h.get_rank() for h in by_compare] == \
+        [h.get_rank() for h in by_key]
+    assert len(calls) == len(hands)
+
+
+def test_rank_invalidated_and_hash(royal_flush_hand):
+    hand = BitHand(royal_flush_hand.get_cards()[:4] + (Card('Hearts', 2), ))
+    assert hand.get_best_hand() == 'high card'
+    hand.add_card(Card('Diamonds', 2))
+    assert hand.get_best_hand() == 'one pair'
+    hand.add_card(royal_flush_hand.get_cards()[4])
+    assert hand.get_best_hand() == 'royal flush'
+
+    vals = ['A', 'K', 'Q', 'J', 10]
+    other_royal = Hand([Card('Hearts', v) for v in vals])
+    assert other_royal == royal_flush_hand
+    assert hash(other_royal) == hash(royal_flush_hand)
+    assert len({other_royal, royal_flush_hand, hand}) == 1
+
+
+def test_rank_cache_lru():
+    cache = RankCache(maxsize=2)
+    royal = [48, 44, 40, 36, 32]
+    assert cache.get_rank(royal) == 1
+    assert cache.get_rank(royal[::-1]) == 1
+    cache.get_rank([0, 4, 8, 12, 17])
+    cache.get_rank(royal)                   # Royal is now most recent
+    cache.get_rank([1, 5, 9, 13, 51, 50, 49])
+    stats = cache.get_stats()
+    assert stats['hits'] == 2 and stats['misses'] == 3
+    assert stats['size'] == 2
+    cache.get_rank(royal)
+    assert cache.get_stats()['hits'] == 3
+    with pytest.raises(ValueError):
+        RankCache(0)
+
+
+def test_rank_cache_enabled(three_player_game, royal_flush_hand):
+    cache = utils.enable_rank_cache(100)
+    try:
+        assert utils.get_rank_cache() is cache
+        assert Hand(royal_flush_hand.get_cards()).get_rank() == 1
+        assert Hand(royal_flush_hand.get_cards()[::-1]).get_rank() == 1
+        for player in three_player_game.get_active_players():
+            player.add_card(Card('Hearts', 2))
+            player.add_card(Card('Hearts', 3))
+            break
+        three_player_game.table = (51, 47, 43, 39, 35)
+        rank = three_player_game.get_hand_rank(player)
+        assert three_player_game.get_best_hand(player).get_rank() == rank
+        assert cache.get_stats()['hits'] >= 2
+    finally:
+        utils.disable_rank_cache()
+    assert utils.get_rank_cache() is None
+
+
+def test_bithand_incremental():
+    deck = Deck()
+    deck.shuffle()
+    hand = BitHand(deck.draw_codes(5))
+    for i in range(2):
+        hand.add_card(deck.draw_codes(1)[0])
+        assert hand.get_rank() == evaluate(hand.get_codes())
+    player = Player(100, 'Dan', hand=BitHand())
+    player.add_card(Card('Hearts', 2))
+    assert isinstance(player.get_hand(), BitHand)
+    with pytest.raises(AssertionError):
+        hand.add_card(hand.get_codes()[0])
+
+
+# ===================== CARD ENCODING TESTS =====================
+
+def test_encoding_roundtrip():
+    codes = set()
+    for code in range(CARDS_IN_A_DECK):
+        suit, val = decode_card(code)
+        assert encode_card(suit, val) == code
+        card = Card.from_int(code)
+        assert card.to_int() == code
+        assert card == Card(suit, val)
+        codes.add(code)
+    assert len(codes) == CARDS_IN_A_DECK
+
+
+def test_encoding_order(high_card, low_card):
+    assert high_card.to_int() == CARDS_IN_A_DECK - 1
+    assert low_card.to_int() >> 2 == 0
+    assert high_card > low_card
+
+
+def test_cards_interned(high_card):
+    assert Card('Spades', 'A') is high_card
+    assert Card.from_int(high_card.to_int()) is high_card
+    assert pickle.loads(pickle.dumps(high_card)) is high_card
+    with pytest.raises(AttributeError):
+        high_card.val = 2
+    with pytest.raises(AssertionError):
+        Card('Stars', 2)
+
+
+def test_hand_views(royal_flush_hand):
+    player = Player(100, 'Dan', hand=royal_flush_hand)
+    cards = player.get_cards()
+    assert isinstance(cards, tuple) and cards is player.get_cards()
+    assert player.has_full_hand()
+    other = Player(100, 'Sam')
+    other.add_card(Card('Hearts', 2))
+    view = other.get_hand()
+    view.add_card(Card('Hearts', 3))
+    assert len(other.get_cards()) == 1 and len(view) == 2
+
+
+def test_deck_codes():
+    deck = Deck()
+    deck.shuffle()
+    codes = deck.draw_codes(5)
+    cards = deck.draw(5)
+    assert all(isinstance(c, int) for c in codes)
+    assert all(isinstance(c, Card) for c in cards)
+    assert len(set(codes) | {c.to_int() for c in cards}) == 10
+    assert deck.get_num_cards() == CARDS_IN_A_DECK - 10
+
+
+def test_deck_cursor():
+    deck = Deck()
+    storage = deck.deck
+    assert deck.draw_codes(3) == [0, 1, 2]
+    assert deck.get_num_cards() == CARDS_IN_A_DECK - 3
+    deck.reset()
+    assert deck.get_num_cards() == CARDS_IN_A_DECK
+    deck.shuffle()
+    dealt = deck.draw_codes(CARDS_IN_A_DECK)
+    assert sorted(dealt) == list(range(CARDS_IN_A_DECK))
+    assert deck.deck is storage
+    with pytest.raises(Exception):
+        deck.draw_codes(1)
+
+
+def test_deck_shuffle_uniform():
+    deck = Deck(random.Random(5))
+    counts = [0] * CARDS_IN_A_DECK
+    for i in range(5200):
+        deck.reset()
+        deck.shuffle()
+        counts[deck.draw_codes(2)[1]] += 1
+    assert min(counts) > 50 and max(counts) < 160
+
+
+def test_hand_from_codes(full_house_hand):
+    codes = full_house_hand.get_codes()
+    hand = Hand(codes)
+    assert hand.get_cards() == full_house_hand.get_cards()
+    assert hand.check_full_house()
+    assert hand.get_sorted() == full_house_hand.get_sorted()
+    assert hand == full_house_hand
+
+
+# ===================== EVALUATOR TESTS =====================
+
+def test_evaluator_extremes(royal_flush_hand):
+    assert royal_flush_hand.get_rank() == 1
+    worst = Hand([Card('Hearts', 7), Card('Clubs', 5), Card('Clubs', 4),
+                  Card('Spades', 3), Card('Diamonds', 2)])
+    assert worst.get_rank() == WORST_RANK == 7462
+    assert rank_category(1) == 'royal flush'
+    assert rank_category(WORST_RANK) == 'high card'
+
+
+def test_evaluator_matches_checkers():
+    deck = Deck()
+    deck.shuffle()
+    for i in range(2000):
+        if deck.get_num_cards() < 10:
+            deck = Deck()
+            deck.shuffle()
+        hand = Hand(deck.draw_codes(5))
+        assert hand.get_best_hand() == hand.get_best_hand_by_checkers()
+        assert rank_category(evaluate5(hand.get_codes())) == \
+            hand.get_best_hand()
+
+
+def test_wheel_is_lowest_straight():
+    wheel = Hand([Card('Hearts', 'A'), Card('Clubs', 2), Card('Clubs', 3),
+                  Card('Spades', 4), Card('Diamonds', 5)])
+    six_high = Hand([Card('Hearts', 6), Card('Clubs', 2), Card('Clubs', 3),
+                     Card('Spades', 4), Card('Diamonds', 5)])
+    assert wheel.get_best_hand() == six_high.get_best_hand() == 'straight'
+    assert six_high > wheel
+
+
+# ===================== SIMULATION TESTS =====================
+
+def test_classify_hands_matches_evaluator():
+    rng = np.random.default_rng(0)
+    hands = simulation.deal_hands(1000, rng)
+    categories = simulation.classify_hands(hands)
+    for cards, category in zip(hands.tolist(), categories):
+        assert rank_category(evaluate5(cards)) == \
+            simulation.HAND_RANKINGS[category]
+
+
+def test_simulate_hand_distr():
+    counter = simulation.simulate_hand_distr(1000, batch_size=300, seed=7)
+    assert list(counter) == simulation.HAND_RANKINGS
+    assert sum(counter.values()) == 1000 * simulation.HANDS_PER_DECK
+    assert counter == simulation.simulate_hand_distr(1000, seed=7,
+                                                     batch_size=300)
+    excluded = simulation.simulate_hand_distr(100, True, seed=7)
+    assert excluded['high card'] == 0
+
+
+def test_stream_hand_distr():
+    snapshots = list(simulation.stream_hand_distr(1000, snapshot_every=400,
+                                                  batch_size=200, seed=7))
+    assert [s['decks'] for s in snapshots] == [400, 800, 1000]
+    final = snapshots[-1]
+    assert final['counter'] == simulation.simulate_hand_distr(
+        1000, batch_size=200, seed=7)
+    assert abs(sum(final['frequencies'].values()) - 1.0) < 1e-9
+    assert all(s['hands_per_sec'] > 0 for s in snapshots)
+
+    stream = simulation.stream_hand_distr(snapshot_every=100, seed=1)
+    for i, snapshot in enumerate(stream):
+        if i == 2:
+            break
+    stream.close()
+    assert snapshot['hands'] == 300 * simulation.HANDS_PER_DECK
+
+
+def test_exact_hand_distr():
+    counter = simulation.exact_hand_distr()
+    assert list(counter.values()) == [4, 36, 624, 3744, 5108, 10200, 54912,
+                                      123552, 1098240, 1302540]
+    assert sum(counter.values()) == simulation.TOTAL_HANDS
+    assert simulation.exact_hand_distr(True)['high card'] == 0
+
+
+def test_sampler_matches_exact():
+    exact = simulation.exact_hand_distr()
+    sampled = simulation.simulate_hand_distr(10000, seed=1)
+    total = 10000 * simulation.HANDS_PER_DECK
+    for hand in ('high card', 'one pair', 'two pair'):
+        expected = exact[hand] / simulation.TOTAL_HANDS
+        assert abs(sampled[hand] / total - expected) < 0.01
+
+
+def test_estimate_hand_distr_modes():
+    exact = simulation.exact_hand_distr()
+    for mode in simulation.ESTIMATOR_MODES:
+        result = simulation.estimate_hand_distr(20000, mode, batch_size=7000,
+                                                seed=2)
+        assert result['mode'] == mode
+        assert result['hands'] >= 20000
+        assert result == simulation.estimate_hand_distr(20000, mode, seed=2,
+                                                        batch_size=7000)
+        for hand in simulation.HAND_RANKINGS:
+            expected = exact[hand] / simulation.TOTAL_HANDS
+            # Standard errors are sample estimates, so allow a few hits
+            # of slack for categories rarely or never sampled
+            assert abs(result['frequencies'][hand] - expected) < \
+                6 * result['std_errors'][hand] + 3 / result['hands']
+    with pytest.raises(ValueError):
+        simulation.estimate_hand_distr(100, 'bogus')
+
+
+def test_estimate_hand_distr_variance_reduction():
+    exact = simulation.exact_hand_distr()
+    royal = exact['royal flush'] / simulation.TOTAL_HANDS
+    result = simulation.estimate_hand_distr(20000, 'importance', seed=4)
+    assert result['std_errors']['royal flush'] < 0.1 * royal
+    assert abs(result['frequencies']['royal flush'] - royal) < 0.3 * royal
+
+    # Pairing categories are constant within a rank pattern
+    result = simulation.estimate_hand_distr(20000, 'stratified', seed=4)
+    for hand in ('four of a kind', 'full house', 'two pair', 'one pair'):
+        assert result['std_errors'][hand] == 0
+        assert result['frequencies'][hand] == pytest.approx(
+            exact[hand] / simulation.TOTAL_HANDS)
+
+    plain = simulation.estimate_hand_distr(20000, 'plain', seed=4)
+    control = simulation.estimate_hand_distr(20000, 'control', seed=4)
+    assert control['std_errors']['flush'] < \
+        0.01 * plain['std_errors']['flush']
+
+
+def test_parallel_hand_distr():
+    counter = parallel.parallel_hand_distr(1000, num_workers=3, seed=11)
+    assert sum(counter.values()) == 1000 * simulation.HANDS_PER_DECK
+    assert counter == parallel.parallel_hand_distr(1000, num_workers=3,
+                                                   seed=11)
+
+
+def test_parallel_tournaments():
+    winners = parallel.parallel_tournaments(5, 3, 100, 10, num_rounds=5,
+                                            num_workers=2, seed=3)
+    assert len(winners) == 5
+    assert all(w <= {'Player 0', 'Player 1', 'Player 2'} for w in winners)
+    assert winners == parallel.parallel_tournaments(5, 3, 100, 10,
+                                                    num_rounds=5,
+                                                    num_workers=3, seed=3)
+
+
+def test_tournament(monkeypatch):
+    monkeypatch.setitem(Player.strategies, 'other',
+                        Player.strategies['random'])
+    mix = ['random', 'random', 'other', 'random']
+    result = tournament.run_tournament(12, mix, num_rounds=15, num_workers=2,
+                                       seed=0, curve_every=5)
+    assert result.num_games == 12
+    assert result.seats == {'random': 3, 'other': 1}
+    assert abs(sum(result.wins.values()) - 12) < 1e-9
+    assert result.get_mean_rounds() == 15
+    for curve in result.bankroll_curves.values():
+        assert len(curve) == 4 and curve[0] == 100
+    total = sum(result.final_bankrolls[s] * result.seats[s]
+                for s in result.strategies)
+    assert abs(total - 400) < 1e-9
+    assert result.final_bankrolls == {s: result.bankroll_curves[s][-1]
+                                      for s in result.strategies}
+
+    again = tournament.run_tournament(12, mix, num_rounds=15, num_workers=1,
+                                      seed=0, chunksize=5, curve_every=5)
+    assert again.wins == result.wins
+    assert again.bankroll_curves == result.bankroll_curves
+    off_grid = tournament.run_tournament(12, mix, num_rounds=15,
+                                         num_workers=2, seed=0,
+                                         curve_every=4)
+    assert [len(c) for c in off_grid.bankroll_curves.values()] == [4, 4]
+    assert off_grid.final_bankrolls == result.final_bankrolls
+    with pytest.raises(ValueError):
+        tournament.run_tournament(1, ['bluffing', 'random'])
+
+
+# ===================== EQUITY TESTS =====================
+
+def test_equity_nuts():
+    hero = [Card('Spades', 'A'), Card('Spades', 'K')]
+    board = [Card('Spades', 'Q'), Card('Spades', 'J'), Card('Spades', 10),
+             Card('Hearts', 2), Card('Clubs', 3)]
+    result = equity(hero, board, num_opponents=5, rng=random.Random(0))
+    assert result.win == result.equity == 1.0
+    assert result.samples == 500
+
+
+def test_equity_early_stopping():
+    hero = [Card('Spades', 'A'), Card('Hearts', 'A')]
+    result = equity(hero, precision=0.02, rng=random.Random(1))
+    assert result.samples < 10 ** 6
+    assert result.get_half_width() <= 0.02
+    assert result.ci[0] <= result.equity <= result.ci[1]
+    assert abs(result.equity - 0.85) < 0.03
+    assert abs(result.win + result.tie + result.lose - 1.0) < 1e-9
+
+
+def test_equity_estimator_incremental():
+    hero = [Card('Clubs', 7).to_int(), Card('Diamonds', 2).to_int()]
+    first, second = EquityEstimator(hero, rng=random.Random(2)), \
+        EquityEstimator(hero, rng=random.Random(2))
+    first.run(200)
+    first.run(300)
+    second.run(500)
+    assert first.get_result().equity == second.get_result().equity
+    with pytest.raises(ValueError):
+        EquityEstimator(hero, board=[hero[0]])
+
+
+def test_equity_strategy_actions():
+    bot = EquityStrategy(time_budget=10, max_samples=200,
+                         rng=random.Random(0))
+    aces = [Card('Spades', 'A'), Card('Hearts', 'A')]
+    board = [Card('Clubs', 'A'), Card('Diamonds', 'A'), Card('Clubs', 2)]
+    trash = [Card('Spades', 7), Card('Hearts', 2)]
+    states = strategy.DecisionState(
+        [to_codes(aces), to_codes(trash), to_codes(trash)],
+        [to_codes(board), to_codes(board), to_codes(board)],
+        [40, 40, 40], [0, 200, 0], [100, 100, 100], [0, 1, 2], [6, 6, 6])
+    actions, amounts = bot.decide_batch(states)
+    assert list(actions) == [strategy.ALL_IN, strategy.FOLD, strategy.CHECK]
+    assert list(bot.last_samples) == [200] * 3
+    assert bot.decisions == 3 and bot.samples == 600
+
+    rich = strategy.Decision(to_codes(aces), to_codes(board), 40.5, 0, 7.5,
+                             0, 6)
+    assert bot.decide(rich) == (strategy.ALL_IN, 0)
+    assert bot.last_samples == [200]
+    states = strategy.DecisionState.from_decisions([rich, rich])
+    states.num_players[:] = 2
+    bot.all_in_equity = 2
+    actions, amounts = bot.decide_batch(states)
+    assert list(actions) == [strategy.RAISE] * 2
+    assert amounts.tolist() == [7.5, 7.5]
+    assert bot.decisions == 6
+
+
+def test_equity_strategy_deadline():
+    bot = EquityStrategy(time_budget=0.005, max_samples=10 ** 9)
+    start = time.perf_counter()
+    equity_estimate, samples = bot.estimate([48, 49], [], 13)
+    assert time.perf_counter() - start < 0.05
+    assert 0 < samples < 10 ** 5
+    assert 0 < equity_estimate < 1
+
+    random.seed(0)
+    game = PokerGame([Player(100, f'Player {i}', strategy='equity')
+                      for i in range(3)], 20)
+    game.play_round()
+    assert sum(p.get_bal() for p in game.players) == 300
+
+
+def test_equity_strategy_registered():
+    code = "import sys, utils; utils.Player(100, 'a', strategy='equity')" + \
+        ".action(); sys.exit('equity' not in sys.modules)"
+    assert subprocess.run([sys.executable, '-c', code],
+                          cwd=os.path.dirname(__file__)).returncode == 0
+    result = tournament.run_tournament(2, ['equity', 'random', 'random'],
+                                       num_rounds=3, num_workers=1, seed=0)
+    assert result.seats == {'equity': 1, 'random': 2}
+
+
+# ===================== PREFLOP TABLE TESTS =====================
+
+def test_preflop_classes():
+    classes = [preflop.hand_class(c) for c in combinations(range(52), 2)]
+    assert sorted(set(classes)) == list(range(preflop.NUM_CLASSES))
+    for index in range(preflop.NUM_CLASSES):
+        combos = preflop.class_combos(index)
+        assert len(combos) == classes.count(index)
+        assert all(preflop.hand_class(c) == index for c in combos)
+        assert preflop.class_from_name(preflop.class_name(index)) == index
+    aces = [Card('Spades', 'A'), Card('Hearts', 'A')]
+    assert preflop.class_name(preflop.hand_class(aces)) == 'AA'
+    assert preflop.class_name(preflop.hand_class([48, 44])) == 'AKs'
+    assert preflop.class_name(preflop.hand_class([48, 45])) == 'AKo'
+
+
+def test_preflop_table_roundtrip(tmp_path):
+    table = preflop.generate_table(samples=2, num_workers=2, seed=0)
+    aa, kk = preflop.class_from_name('AA'), preflop.class_from_name('KK')
+    assert table.get_heads_up(aa, aa) == 0.5
+    assert table.get_heads_up(aa, kk) + table.get_heads_up(kk, aa) == 1.0
+
+    path = str(tmp_path / 'preflop.bin')
+    table.save(path)
+    loaded = preflop.PreflopTable.load(path)
+    assert loaded.heads_up == table.heads_up
+    assert loaded.vs_random == table.vs_random
+    assert loaded.lookup([51, 50], 3) == table.get_vs_random(aa, 3)
+
+    loaded.vs_random[0] = 1.5
+    with pytest.raises(AssertionError):
+        preflop.PreflopTable(loaded.heads_up, loaded.vs_random)
+
+
+# ===================== ISOMORPHISM TESTS =====================
+
+def test_isomorphism_class_counts():
+    flops = {isomorphism.canonicalize((), flop)[1]
+             for flop in combinations(range(CARDS_IN_A_DECK), 3)}
+    assert len(flops) == 1755
+    holes = {isomorphism.canonicalize(hole)[0]
+             for hole in combinations(range(CARDS_IN_A_DECK), 2)}
+    assert len(holes) == preflop.NUM_CLASSES
+
+
+def test_isomorphism_roundtrip():
+    rng = random.Random(4)
+    for i in range(200):
+        cards = rng.sample(range(CARDS_IN_A_DECK), 7)
+        hole, board = cards[:2], cards[2:]
+        canonical_hole, canonical_board, perm = \
+            isomorphism.canonicalize(hole, board)
+        assert isomorphism.is_canonical(canonical_hole, canonical_board)
+        assert isomorphism.decanonicalize(canonical_hole, canonical_board,
+                                          perm) == \
+            (tuple(sorted(hole)), tuple(sorted(board)))
+        index = isomorphism.canonical_index(hole, board)
+        assert isomorphism.from_canonical_index(index, 2, 5) == \
+            (canonical_hole, canonical_board)
+        rank = evaluate(hole + board)
+        assert evaluate(canonical_hole + canonical_board) == rank
+
+
+def test_isomorphism_cards(high_card, low_card):
+    hearts = [Card('Hearts', 'A'), Card('Hearts', 2)]
+    spades = [Card('Spades', 'A'), Card('Spades', 2)]
+    assert isomorphism.canonical_index(hearts) == \
+        isomorphism.canonical_index(spades)
+    assert isomorphism.canonical_index([high_card, low_card]) != \
+        isomorphism.canonical_index(hearts)
+
+
+# ===================== CHECKREP POLICY TESTS =====================
+
+@pytest.fixture
+def restore_checkrep():
+    yield
+    set_checkrep_policy('full')
+
+
+def test_checkrep_off(restore_checkrep):
+    deck = Deck()
+    deck.deck.append(deck.deck[0])          # Break the no-duplicates invariant
+    with pytest.raises(AssertionError):
+        deck.get_num_cards()
+    set_checkrep_policy('off')
+    assert deck.get_num_cards() == CARDS_IN_A_DECK + 1
+
+
+def test_checkrep_sampled(restore_checkrep):
+    set_checkrep_policy('sampled', 3, cls=Deck)
+    assert get_checkrep_policy(Deck) == ('sampled', 3)
+    assert get_checkrep_policy(Hand) == ('full', 100)
+    deck = Deck()
+    deck.deck.append(deck.deck[0])
+    deck.get_num_cards()
+    with pytest.raises(AssertionError):
+        deck.get_num_cards()
+
+
+def test_checkrep_spec(restore_checkrep):
+    load_checkrep_policy('sampled:50, Hand=off')
+    assert get_checkrep_policy() == ('sampled', 50)
+    assert get_checkrep_policy('Card') == ('sampled', 50)
+    assert get_checkrep_policy('Hand') == ('off', 100)
+    with pytest.raises(ValueError):
+        set_checkrep_policy('sometimes')
+
+
+def test_checkrep_nested_class(restore_checkrep):
+    def make_class():
+        class Nested():
+            @utils.checkrep_policy
+            def _checkrep(self):
+                assert False
+        return Nested
+
+    first, second = make_class(), make_class()
+    with pytest.raises(AssertionError):
+        first()._checkrep()
+    set_checkrep_policy('off', cls=first)
+    assert get_checkrep_policy(first) == ('off', 100)
+    assert get_checkrep_policy(second) == ('full', 100)
+    first()._checkrep()
+    with pytest.raises(AssertionError):
+        second()._checkrep()
+    assert get_checkrep_calls(first) == 2
+    assert get_checkrep_calls(second) == 1
+
+
+def test_checkrep_late_class(restore_checkrep):
+    load_checkrep_policy('full, LateClass=off')
+    assert get_checkrep_policy('LateClass') == ('off', 100)
+
+    class LateClass():
+        @utils.checkrep_policy
+        def _checkrep(self):
+            assert False
+
+    LateClass()._checkrep()
+    assert get_checkrep_policy(LateClass) == ('off', 100)
+
+    class OtherLateClass():
+        @utils.checkrep_policy
+        def _checkrep(self):
+            assert False
+
+    assert get_checkrep_policy(OtherLateClass) == ('full', 100)
+    with pytest.raises(AssertionError):
+        OtherLateClass()._checkrep()
+
+
+# ===================== BENCHMARK TESTS =====================
+
+def test_benchmark_compare():
+    results = benchmark.run_all(['card_construction'], repeats=2,
+                                min_time=0.01)
+    name = 'micro/card_construction'
+    assert results['results'][name]['ops_per_sec'] > 0
+    assert results['meta']['checkrep_policy'] == get_checkrep_policy()
+
+    baseline = {'results': {name: dict(results['results'][name])}}
+    assert benchmark.compare(results, baseline) == []
+    baseline['results'][name]['ops_per_sec'] *= 2
+    assert [r[0] for r in benchmark.compare(results, baseline)] == [name]
+    assert benchmark.compare(results, baseline, threshold=0.6) == []
+
+
 # ===================== POKER GAME TESTS =====================
 
 # def test_config(three_player_game):
@@ -249,6 +895,279 @@ def test_raise(three_player_game):
     assert dan.get_bal() == 90
 
 
+def test_game_stats():
+    random.seed(0)
+    game = PokerGame([Player(100, f'Player {i}') for i in range(6)], 20)
+    assert game.stats is None
+    stats = game.enable_stats()
+    # The stats' own _checkrep runs after each round is counted
+    calls = get_checkrep_calls() - get_checkrep_calls(GameStats)
+    for i in range(20):
+        game.play_round()
+
+    assert stats.rounds == 20
+    assert set(stats.phase_times) == set(GameStats.PHASES)
+    assert all(t > 0 for t in stats.phase_times.values())
+    assert stats.betting_iterations >= 20
+    assert stats.checkrep_calls == \
+        get_checkrep_calls() - get_checkrep_calls(GameStats) - calls
+    assert get_checkrep_calls(GameStats) >= 20
+    assert get_checkrep_calls(PokerGame) > 0
+    summary = stats.get_summary()
+    assert abs(sum(summary['phase_share'].values()) - 1) < 1e-9
+    assert summary['mean_hand_evaluations'] == stats.hand_evaluations / 20
+    assert stats.last_round['hand_evaluations'] in (0, *range(2, 7))
+
+    game.disable_stats()
+    game.play_round()
+    assert stats.rounds == 20
+
+
+def test_hand_history(tmp_path):
+    random.seed(0)
+    path = str(tmp_path / 'hands')
+    players = [Player(100, f'Player {i}') for i in range(4)]
+    with history.HandHistoryWriter(path, buffer_rounds=3) as writer:
+        game = PokerGame(players, 20, recorder=writer)
+        for i in range(5):
+            game.play_round()
+    with history.HandHistoryWriter(path) as writer:
+        assert writer.num_rounds == 5
+        game.recorder = writer
+        game.play_round()
+
+    with history.HandHistory(path) as hands:
+        check_hand_history(hands, players)
+    assert len(hands) == 0
+
+    with open(f'{path}.actions', 'r+b') as f:
+        f.write(b'XXXX')
+    with pytest.raises(ValueError):
+        history.HandHistoryWriter(path)
+    with pytest.raises(ValueError):
+        history.HandHistory(path)
+
+
+def check_hand_history(hands, players):
+    assert len(hands) == 6
+    assert list(hands['round']) == list(range(6))
+    assert (hands['num_players'] == 4).all()
+    assert (hands['pot'] == hands['payouts'].sum(axis=1)).all()
+    assert (hands['num_winners'] >= 1).all()
+    assert (hands['hole'][:, 4:] == history.NO_CARD_U8).all()
+    assert sum(p.get_bal() for p in players) == 400
+    for i in range(len(hands)):
+        actions = hands.get_round_actions(i)
+        assert (actions['round'] == i).all()
+        assert actions['amount'].sum() == hands['pot'][i]
+        assert actions['action'][0] == history.ACTION_CODES['Small blind']
+        board = [c for c in hands['board'][i] if c != history.NO_CARD_U8]
+        hole = [c for c in hands['hole'][i].ravel() if c != history.NO_CARD_U8]
+        assert len(set(board) | set(hole)) == len(board) + len(hole)
+    assert len(hands.actions) == hands['num_actions'].sum()
+
+
+def test_evaluate_batch():
+    rng = np.random.default_rng(0)
+    cards = rng.permuted(np.tile(np.arange(52), (2000, 1)), axis=1)[:, :7]
+    ranks = multitable.evaluate_batch(cards)
+    assert all(rank == evaluate(list(row)) for rank, row in zip(ranks, cards))
+
+
+def test_multitable_matches_poker_game():
+    random.seed(0)
+    rng = np.random.default_rng(0)
+    players = [Player(100, f'Player {i}', strategy='check') for i in range(5)]
+    game = PokerGame(players, 20)
+    tables = multitable.MultiTableGame(1, 5, 100, 20)
+    for i in range(30):
+        deck = rng.permutation(CARDS_IN_A_DECK)
+        game.deck.deck, game.deck.top = [int(c) for c in deck], 0
+        game.deck.shuffled = False
+        winner = game.play_round()
+        winners = tables.play_round(decks=deck[None, :])
+        assert {players.index(p) for p in winner} == \
+            set(np.flatnonzero(winners[0]))
+        if len(winner) > 1:
+            break                   # Leftover chips go to a random winner
+        assert [p.get_bal() for p in players] == list(tables.bal[0])
+
+
+def test_multitable_random_policy():
+    tables = multitable.MultiTableGame(200, 6, 100, 20,
+                                       policy=multitable.random_policy,
+                                       seed=0)
+    winners = tables.iterate_game()
+    assert not tables.get_live_tables().any()
+    assert (winners.sum(axis=1) == 1).all()
+    assert (tables.bal[winners] == 600).all()
+    assert (tables.status[~winners] == multitable.INACTIVE).all()
+
+
+class RecordingStrategy(strategy.Strategy):
+    """Checks, remembering every batch of states it was asked about."""
+
+    def __init__(self):
+        self.batches = []
+
+    def decide_batch(self, states):
+        self.batches.append(states)
+        return strategy.CheckStrategy().decide_batch(states)
+
+
+def test_strategy_sees_game_state(monkeypatch):
+    recorder = RecordingStrategy()
+    monkeypatch.setitem(Player.strategies, 'recording', recorder)
+    random.seed(0)
+    players = [Player(100, f'Player {i}', strategy='recording')
+               for i in range(4)]
+    game = PokerGame(players, 20)
+    game.play_round()
+
+    first = recorder.batches[0]
+    assert len(first) == 1
+    assert list(first.position) == [2]          # First to act after blinds
+    assert list(first.pot) == [30] and list(first.round_cost) == [20]
+    assert list(first.num_players) == [4] and list(first.board_size) == [0]
+    assert [len(b) for b in recorder.batches] == [1] * len(recorder.batches)
+    assert max(b.board_size[0] for b in recorder.batches) == 5
+    assert sum(p.get_bal() for p in players) == 400
+
+
+def test_random_strategy():
+    states = strategy.DecisionState([[0, 1], [2, 3], [4, 5]], [[6, 7, 8]] * 3,
+                                    [30] * 3, [20] * 3, [100, 5, 0],
+                                    [0, 1, 2], [3] * 3)
+    assert list(states.board_size) == [3] * 3
+    actions, amounts = strategy.RandomStrategy(rng=random.Random(0)) \
+        .decide_batch(states)
+    assert len(actions) == 3
+    assert set(actions) <= {strategy.FOLD, strategy.CHECK, strategy.RAISE,
+                            strategy.ALL_IN}
+    assert list(amounts) == [10, 5, 0]
+
+    random.seed(0)
+    player = Player(100, 'Player 0', Hand([0, 1]))
+    for i in range(50):
+        action, amount = player.action()
+        assert action in ('Fold', 'Check', 'Raise')
+        if player.is_all_in():
+            assert (action, amount) in (('Raise', 100), ('Check', None))
+
+
+def test_single_decisions():
+    assert Player(100, 'Player 0', strategy='check').action() == ('Check', 0)
+    random.seed(0)
+    for cards in ([], [0]):
+        player = Player(100, 'Player 0', Hand(cards))
+        for i in range(20):
+            assert player.action()[0] in ('Fold', 'Check', 'Raise')
+
+    decision = strategy.Decision([5], [], 12.5, 0, 7.5, 0, 2)
+    assert strategy.RandomStrategy(raise_amount=50).decide(decision)[1] == 7.5
+    recorder = RecordingStrategy()
+    assert recorder.decide(decision) == (strategy.CHECK, 0)
+    states = recorder.batches[0]
+    assert states.hole.tolist() == [[5, strategy.NO_CARD]]
+    assert states.pot.tolist() == [12.5] and states.stack.tolist() == [7.5]
+
+
+def test_utils_without_numpy():
+    code = "import sys, utils; sys.exit('numpy' in sys.modules)"
+    assert subprocess.run([sys.executable, '-c', code],
+                          cwd=os.path.dirname(__file__)).returncode == 0
+
+
+def test_multitable_strategy_batches():
+    recorder = RecordingStrategy()
+    tables = multitable.MultiTableGame(50, 4, 100, 20, policy=recorder,
+                                       seed=0)
+    tables.play_round()
+    assert len(recorder.batches[0]) == 50
+    assert (recorder.batches[0].position == 2).all()
+    assert (recorder.batches[0].pot == 30).all()
+
+
+class ScriptedStrategy(strategy.Strategy):
+    """Plays a fixed sequence of action codes, raising 10 at most."""
+
+    def __init__(self, script):
+        self.script = iter(script)
+
+    def decide_batch(self, states):
+        actions = [next(self.script) for i in range(len(states))]
+        return np.array(actions), np.minimum(10, states.stack)
+
+
+def test_betting_ring_matches_multitable(monkeypatch):
+    rng = np.random.default_rng(1)
+    script = [int(a) for a in rng.integers(4, size=10 ** 4)]
+    monkeypatch.setitem(Player.strategies, 'scripted',
+                        ScriptedStrategy(script))
+    random.seed(0)
+    players = [Player(100, f'Player {i}', strategy='scripted')
+               for i in range(7)]
+    game = PokerGame(players, 20)
+    tables = multitable.MultiTableGame(1, 7, 100, 20,
+                                       policy=ScriptedStrategy(script))
+    for i in range(20):
+        if not tables.get_live_tables()[0]:
+            break
+        deck = rng.permutation(CARDS_IN_A_DECK)
+        game.deck.deck, game.deck.top = [int(c) for c in deck], 0
+        game.deck.shuffled = False
+        winner = game.play_round()
+        winners = tables.play_round(decks=deck[None, :])
+        assert {players.index(p) for p in winner} == \
+            set(np.flatnonzero(winners[0]))
+        if len(winner) > 1:
+            break                   # Leftover chips go to a random winner
+        assert [p.get_bal() for p in players] == list(tables.bal[0])
+        assert game.num_in_hand == sum(p.get_bal() > 0 for p in players)
+        assert game.num_checked == 0
+    assert i > 0
+
+
+def test_stream_game(three_player_game):
+    snapshots = list(three_player_game.stream_game(6, snapshot_every=4))
+    assert [s['round'] for s in snapshots] == [4, 6]
+    for snapshot in snapshots:
+        assert sum(snapshot['balances']) == 300
+        assert snapshot['num_solvent'] >= 1
+
+
+def test_winner(three_player_game):
+    dan, sam, emma = three_player_game.get_active_players()
+    for player, vals in ((dan, ['A', 'A']), (sam, ['K', 'Q']),
+                         (emma, [2, 7])):
+        for suit, val in zip(['Clubs', 'Hearts'], vals):
+            player.add_card(Card(suit, val))
+    board = [Card('Spades', 'A'), Card('Diamonds', 'J'), Card('Spades', 10),
+             Card('Diamonds', 4), Card('Hearts', 3)]
+    three_player_game.table = tuple(c.to_int() for c in board)
+
+    # Sam's straight beats Dan's three aces
+    assert three_player_game.get_winner() == [sam]
+    for player in (dan, sam, emma):
+        best = three_player_game.get_best_hand(player)
+        assert best.get_rank() == three_player_game.get_hand_rank(player)
+    assert three_player_game.get_best_hand(sam).get_best_hand() == 'straight'
+
+
+def test_board_plays(three_player_game):
+    hole_cards = [[Card('Clubs', 2), Card('Diamonds', 3)],
+                  [Card('Spades', 2), Card('Clubs', 4)],
+                  [Card('Diamonds', 2), Card('Spades', 5)]]
+    for player, cards in zip(three_player_game.get_active_players(),
+                             hole_cards):
+        for card in cards:
+            player.add_card(card)
+    board = [Card('Hearts', 'A'), Card('Hearts', 'K'), Card('Hearts', 'Q'),
+             Card('Hearts', 'J'), Card('Hearts', 10)]
+    three_player_game.table = tuple(c.to_int() for c in board)
+    assert len(three_player_game.get_winner()) == 3
+
+
 
 
 if __name__ == "__main__":
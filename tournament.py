@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Tournament runner: plays many independent PokerGames across a process pool
+and aggregates the results per Player.strategy.
+
+A tournament is specified by a strategy mix, one strategy name per seat
+(e.g. ['random'] * 6); seats are shuffled every game so no strategy keeps a
+fixed position. Games are run by parallel.run_games, which seeds every game
+from its own stream, so results do not depend on the number of workers or
+the chunk size.
+"""
+
+import random
+
+from parallel import run_games
+from utils import Player, PokerGame, checkrep_policy
+
+DEFAULT_CURVE_EVERY = 10
+
+
+def play_game(strategy_mix, bal, cost, num_rounds=None,
+              curve_every=DEFAULT_CURVE_EVERY, rng=None):
+    """
+    Plays one PokerGame with a player per entry of `strategy_mix` until a
+    single player has money left (or for `num_rounds` rounds, after which
+    the richest players win). Returns a dict with
+        rounds (int): rounds played
+        winners (list): strategy of each winner
+        curve (list): per-strategy total bankroll (dict) after round 0
+                      and every `curve_every` rounds
+        final (dict): per-strategy total bankroll after the final round
+    """
+    rng = random if rng is None else rng
+    seats = list(strategy_mix)
+    rng.shuffle(seats)
+    players = [Player(bal, f'Player {i}', strategy=strategy)
+               for i, strategy in enumerate(seats)]
+    game = PokerGame(players, cost)
+
+    def bankrolls():
+        totals = dict.fromkeys(strategy_mix, 0)
+        for p in players:
+            totals[p.strategy] += p.get_bal()
+        return totals
+
+    curve = [bankrolls()]
+    rounds = 0
+    while True:
+        game.play_round()
+        rounds += 1
+        balances = [p.get_bal() for p in players]
+        if num_rounds is None:
+            done = sum(1 for b in balances if b > 0) == 1
+        else:
+            done = rounds == num_rounds
+        if rounds % curve_every == 0:
+            curve.append(bankrolls())
+        if done:
+            break
+
+    best = max(balances)
+    winners = [p.strategy for p, b in zip(players, balances) if b == best]
+    return {'rounds': rounds, 'winners': winners, 'curve': curve,
+            'final': bankrolls()}
+
+
+class TournamentResult():
+    """
+    Aggregate results of a tournament, per strategy.
+        num_games (int): games played
+        strategies (tuple): distinct strategies, sorted
+        seats (dict): number of seats per strategy in every game
+        wins (dict): games won per strategy, a k-way tie counting 1/k
+        rounds (list): rounds played by each game, in game order
+        curve_every (int): rounds between bankroll curve points
+        bankroll_curves (dict): mean bankroll per seat of each strategy
+                                after round 0, curve_every, 2 * curve_every,
+                                ...; games that already ended contribute
+                                their final bankrolls
+        final_bankrolls (dict): mean bankroll per seat of each strategy
+                                at the end of its games
+
+    Rep invariant:
+        num_games == len(rounds) > 0
+        sum(wins.values()) == num_games (up to rounding)
+        all bankroll curves have the same length
+    """
+
+    def __init__(self, strategy_mix, games, curve_every):
+        self.num_games = len(games)
+        self.strategies = tuple(sorted(set(strategy_mix)))
+        self.seats = {s: strategy_mix.count(s) for s in self.strategies}
+        self.curve_every = curve_every
+        self.rounds = [game['rounds'] for game in games]
+
+        self.wins = dict.fromkeys(self.strategies, 0.0)
+        for game in games:
+            for strategy in game['winners']:
+                self.wins[strategy] += 1 / len(game['winners'])
+
+        length = max(len(game['curve']) for game in games)
+        sums = {s: [0.0] * length for s in self.strategies}
+        for game in games:
+            curve = game['curve']
+            for i in range(length):
+                point = curve[i] if i < len(curve) else game['final']
+                for strategy in self.strategies:
+                    sums[strategy][i] += point[strategy]
+        self.bankroll_curves = {
+            s: [total / (self.num_games * self.seats[s]) for total in sums[s]]
+            for s in self.strategies}
+        self.final_bankrolls = {
+            s: sum(game['final'][s] for game in games) /
+            (self.num_games * self.seats[s])
+            for s in self.strategies}
+        self._checkrep()
+
+    @checkrep_policy
+    def _checkrep(self):
+        assert self.num_games == len(self.rounds) > 0
+        assert abs(sum(self.wins.values()) - self.num_games) < 1e-6
+        assert len({len(c) for c in self.bankroll_curves.values()}) == 1
+
+    def get_win_rate(self, strategy):
+        """Fraction of games won by some player of `strategy`."""
+        return self.wins[strategy] / self.num_games
+
+    def get_win_rate_per_seat(self, strategy):
+        """Win rate of a single seat of `strategy`; 1 / num_players for a
+        strategy no better than the field."""
+        return self.get_win_rate(strategy) / self.seats[strategy]
+
+    def get_mean_rounds(self):
+        return sum(self.rounds) / self.num_games
+
+    def get_summary(self):
+        return {s: {'seats': self.seats[s],
+                    'win_rate': self.get_win_rate(s),
+                    'win_rate_per_seat': self.get_win_rate_per_seat(s),
+                    'final_bankroll': self.final_bankrolls[s]}
+                for s in self.strategies}
+
+    def __str__(self):
+        result_str = f'{self.num_games} games, ' + \
+                     f'{self.get_mean_rounds():.1f} rounds on average'
+        for strategy, row in self.get_summary().items():
+            result_str += f'\n- {strategy} ({row["seats"]} seats): ' + \
+                f'win rate {row["win_rate"]:.4f}, ' + \
+                f'per seat {row["win_rate_per_seat"]:.4f}'
+        return result_str
+
+    def __repr__(self):
+        return str(self)
+
+
+def run_tournament(num_games, strategy_mix, bal=100, cost=20,
+                   num_rounds=None, num_workers=None, seed=None,
+                   chunksize=None, curve_every=DEFAULT_CURVE_EVERY):
+    """
+    Plays `num_games` games of the seats in `strategy_mix` (starting
+    balance `bal`, cost `cost`, optionally capped at `num_rounds` rounds)
+    across `num_workers` processes (default: all cores) and returns a
+    TournamentResult. Games are sent to workers `chunksize` at a time
+    (default: about 4 chunks per worker).
+    """
+    strategy_mix = list(strategy_mix)
+    for strategy in strategy_mix:
+        if strategy not in Player.strategies:
+            raise ValueError(f"Unknown strategy: {strategy}")
+    games = run_games(play_game,
+                      (strategy_mix, bal, cost, num_rounds, curve_every),
+                      num_games, num_workers, seed, chunksize)
+    return TournamentResult(strategy_mix, games, curve_every)
+
+
+if __name__ == '__main__':
+    print(run_tournament(200, ['random'] * 6, seed=0))
@@ -1,7 +1,20 @@
 #!/usr/bin/env python3
 
 import random
+import time
 from functools import total_ordering
+from itertools import combinations
+
+from checkrep import checkrep_policy, get_checkrep_calls
+# Re-exported so the checkrep policy API stays importable from utils
+from checkrep import CHECKREP_OFF, CHECKREP_SAMPLED, CHECKREP_FULL, \
+    CHECKREP_LEVELS, CHECKREP_ENV_VAR, DEFAULT_SAMPLE_RATE, \
+    set_checkrep_policy, get_checkrep_policy, \
+    load_checkrep_policy  # noqa: F401
+from strategy import Decision, RandomStrategy, CheckStrategy, LazyStrategy, \
+    ACTIONS, RAISE, ALL_IN
+from evaluator import evaluate, evaluate5, rank_category, rank_from_state, \
+    RankCache, STRAIGHT_BEST, ROYAL_MASK
 
 VALID_SUITS = {'Hearts', 'Diamonds', 'Spades', 'Clubs'}
 VALID_VALUES = {*range(2, 11)} | {'J', 'Q', 'K', 'A'}
@@ -9,6 +22,7 @@ CARDS_IN_A_DECK = 52
 CARDS_IN_A_HAND = 5
 STARTING_NUM_CARDS = 2
 MAX_CARDS_ON_TABLE = 5
+MAX_CARDS_IN_BITHAND = STARTING_NUM_CARDS + MAX_CARDS_ON_TABLE
 MIN_NUM_PLAYERS = 2
 MAX_NUM_PLAYERS = 14
 ROYAL_FLUSH_VALS = set(['A', 'K', 'Q', 'J', 10])
@@ -19,11 +33,65 @@ HAND_RANKINGS = ['royal flush', 'straight flush', 'four of a kind',
                  'full house', 'flush', 'straight', 'three of a kind',
                  'two pair', 'one pair', 'high card']
 
+# Integer card encoding: code = 4 * rank + suit, with rank 0-12 (2 through A)
+# and suit 0-3 in the order below. Codes run from 0 to 51.
+SUITS = ('Clubs', 'Diamonds', 'Hearts', 'Spades')
+VALUES = (2, 3, 4, 5, 6, 7, 8, 9, 10, 'J', 'Q', 'K', 'A')
+NUM_RANKS = len(VALUES)
+NUM_SUITS = len(SUITS)
+SUIT_INDEX = {suit: i for i, suit in enumerate(SUITS)}
+VALUE_INDEX = {val: i for i, val in enumerate(VALUES)}
+
 
 def next_i(start, array):
     return (start + 1) % len(array)
 
 
+_rank_cache = None
+
+
+def enable_rank_cache(maxsize=None):
+    """
+    Puts a shared, bounded LRU RankCache in front of hand evaluation in
+    Hand.get_rank/get_best_hand and PokerGame.get_hand_rank/get_best_hand,
+    replacing any previous one. Returns the cache, whose get_stats() reports
+    hits and misses.
+    """
+    global _rank_cache
+    _rank_cache = RankCache() if maxsize is None else RankCache(maxsize)
+    return _rank_cache
+
+
+def disable_rank_cache():
+    global _rank_cache
+    _rank_cache = None
+
+
+def get_rank_cache():
+    """The active RankCache, or None if caching is disabled."""
+    return _rank_cache
+
+
+def encode_card(suit, val):
+    """Returns the integer code (0-51) of the card with `suit` and `val`."""
+    return 4 * VALUE_INDEX[val] + SUIT_INDEX[suit]
+
+
+def decode_card(code):
+    """Returns the (suit, val) pair of the card with integer code `code`."""
+    return SUITS[code & 3], VALUES[code >> 2]
+
+
+def card_rank(code):
+    """Rank index (0 for 2, 12 for A) of an integer card code."""
+    return code >> 2
+
+
+def card_suit(code):
+    """Suit index (see SUITS) of an integer card code."""
+    return code & 3
+
+
 @total_ordering
 class Card():
     """
@@ -36,17 +104,49 @@ class Card():
 
     Abstraction function:
         AF(suit, val) = Card of suit `suit` with value `val`
+
+    The integer code (see encode_card) is the canonical representation used
+    by Deck, Hand and PokerGame; Card is a view over it for display.
+
+    Cards are immutable and interned: there is exactly one instance per card
+    (see CARDS), and Card(suit, val) returns it rather than a new object.
     """
 
-    def __init__(self, suit, val):
-        self.suit = suit
-        self.val = val
-        self._checkrep()
+    __slots__ = ('suit', 'val', 'code')
+
+    def __new__(cls, suit, val):
+        assert (suit, val) in _CARDS_BY_NAME, f"Invalid card: {val} of {suit}"
+        return _CARDS_BY_NAME[(suit, val)]
+
+    @classmethod
+    def _intern(cls, code):
+        card = object.__new__(cls)
+        suit, val = decode_card(code)
+        object.__setattr__(card, 'suit', suit)
+        object.__setattr__(card, 'val', val)
+        object.__setattr__(card, 'code', code)
+        card._checkrep()
+        return card
 
+    @classmethod
+    def from_int(cls, code):
+        return CARDS[code]
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Card is immutable")
+
+    def __reduce__(self):
+        return Card.from_int, (self.code, )
+
+    @checkrep_policy
     def _checkrep(self):
         assert self.suit in VALID_SUITS
         assert self.val in VALID_VALUES
 
+    def to_int(self):
+        self._checkrep()
+        return self.code
+
     def get_suit(self):
         self._checkrep()
         return self.suit
@@ -67,71 +167,95 @@ class Card():
         if not isinstance(other, Card):
             raise TypeError("Improper comparison type")
         self._checkrep()
-        return self.suit == other.suit and self.val == other.val
+        return self.code == other.code
 
     def __gt__(self, other):
         if not isinstance(other, Card):
             raise TypeError("Improper comparison type")
         self._checkrep()
-        return self.val > other.val
+        return self.code >> 2 > other.code >> 2
 
     def __hash__(self):
         self._checkrep()
-        return hash((self.suit, self.val))
+        return hash(self.code)
+
+
+CARDS = tuple(Card._intern(code) for code in range(CARDS_IN_A_DECK))
+_CARDS_BY_NAME = {(card.suit, card.val): card for card in CARDS}
 
 
 class Deck():
     """
-    Represents a deck of cards as an array.
-    Top card corresponds to index 0
+    Represents a deck of cards as an array of integer card codes.
+    Cards are drawn from index `top` onwards; cards before it have been dealt
+
+    Shuffling is lazy: shuffle() only marks the undealt cards as unordered,
+    and each draw performs the next Fisher-Yates step, so only as many cards
+    as are dealt ever get randomized. reset() returns all cards to the deck
+    without reallocating it; their order is then unspecified until the next
+    shuffle().
 
     Rep invariant:
-        must be composed of card objects
-        cannot have duplicate cards
-        may only have at most 52 cards
+        deck is a permutation of the 52 integer card codes
+        0 <= top <= 52
 
     Abstraction function:
-        AF(deck) = Standard deck
+        AF(deck, top) = Standard deck holding cards deck[top:]
 
     """
 
-    def __init__(self):
-        self.deck = []
-        for suit in VALID_SUITS:
-            for val in VALID_VALUES:
-                self.deck += [Card(suit, val)]
+    def __init__(self, rng=None):
+        self.deck = list(range(CARDS_IN_A_DECK))
+        self.top = 0
+        self.shuffled = False
+        self.rng = random if rng is None else rng
         self._checkrep()
 
+    @checkrep_policy
     def _checkrep(self):
         assert len(set(self.deck)) == len(self.deck)
-        assert len(self.deck) > 0
-        for card in self.deck:
-            assert isinstance(card, Card)
+        assert 0 <= self.top <= len(self.deck)
+        for code in self.deck:
+            assert isinstance(code, int) and 0 <= code < CARDS_IN_A_DECK
 
     def shuffle(self):
-        deck_len = len(self.deck)
-        shuffle_indices = random.sample(range(0, deck_len), deck_len)
-        new_deck = []
-        for i in shuffle_indices:
-            new_deck.append(self.deck[i])
-        self.deck = [] + new_deck
+        self.shuffled = True
         self._checkrep()
 
-    def draw(self, num_cards):
-        cards = []
-        if num_cards > len(self.deck):
+    def reset(self):
+        """
+        Returns all dealt cards to the deck and marks it unshuffled. The
+        cards keep the previous round's partially shuffled order, so drawing
+        again before shuffle() deals the same cards as last time.
+        """
+        self.top = 0
+        self.shuffled = False
+        self._checkrep()
+
+    def draw_codes(self, num_cards):
+        """Draws `num_cards` cards and returns them as integer codes."""
+        deck, top = self.deck, self.top
+        end = top + num_cards
+        if end > len(deck):
             raise Exception("Not enough cards in deck")
 
-        for i in range(num_cards):
-            cards.append(self.deck[-1])
-            self.deck = self.deck[:-1]
+        if self.shuffled:
+            rand, num_left = self.rng.random, len(deck) - top
+            for i in range(top, end):
+                j = i + int(rand() * num_left)
+                deck[i], deck[j] = deck[j], deck[i]
+                num_left -= 1
 
+        self.top = end
         self._checkrep()
-        return cards
+        return deck[top:end]
+
+    def draw(self, num_cards):
+        return [CARDS[code] for code in self.draw_codes(num_cards)]
 
     def get_num_cards(self):
         self._checkrep()
-        return len(self.deck)
+        return len(self.deck) - self.top
 
 
 class Player():
@@ -140,7 +264,7 @@ class Player():
         bal (float): player balance
         name (str): player name
         hand (Hand): player's current hand
-        strategy (str): player strategy (in {random, conservative, aggressive})
+        strategy (str): player strategy, a key of Player.strategies
 
     Rep invariant:
         bal >= 0
@@ -150,9 +274,12 @@ class Player():
         AF(bal, name, hand, strategy, all_in_flag) = Player satisfying args
     """
 
-    # TODO: Add more strategies
+    # Name -> strategy.Strategy; register new strategies here. Each is a
+    # single instance shared by every player using it
     strategies = {
-        'random': lambda args: random.choice(args)
+        'random': RandomStrategy(),
+        'check': CheckStrategy(),
+        'equity': LazyStrategy('equity', 'EquityStrategy')
     }
 
     def __init__(self, bal, name, hand=None, strategy='random'):
@@ -163,6 +290,7 @@ class Player():
         self.all_in_flag = False
         self._checkrep()
 
+    @checkrep_policy
     def _checkrep(self):
         assert self.bal >= 0
         assert self.strategy in self.strategies
@@ -179,7 +307,17 @@ class Player():
 
     def get_hand(self):
         self._checkrep()
-        return Hand(self.hand.get_cards())
+        return self.hand.copy()
+
+    def get_cards(self):
+        """Read-only view of the player's cards (a tuple of Cards)."""
+        self._checkrep()
+        return self.hand.cards
+
+    def get_codes(self):
+        """Read-only view of the player's cards as integer codes."""
+        self._checkrep()
+        return self.hand.codes
 
     def add_card(self, card):
         self.hand.add_card(card)
@@ -208,8 +346,13 @@ class Player():
         self.all_in_flag = False
         self._checkrep()
 
-    def action(self, table=None, requested_action=None):
-        if self.all_in:
+    def action(self, game=None, requested_action=None):
+        '''
+        Returns the player's (action, amount) for their turn in `game` (a
+        PokerGame, whose state the strategy sees), as decided by their
+        strategy. Raises are capped at the player's balance.
+        '''
+        if self.all_in_flag:
             self._checkrep()
             return 'Check', None
 
@@ -217,17 +360,20 @@ class Player():
             self._checkrep()
             return requested_action
 
-        actions = {'Fold', 'Check', 'Raise', 'All-in'}
-        action = self.strategies[self.strategy](actions)
-        if action == 'Raise':
+        if game is None:
+            state = Decision(self.hand.codes, (), 0, 0, self.bal, 0, 1)
+        else:
+            state = game.get_decision_state(self)
+        action, amount = self.strategies[self.strategy].decide(state)
+        if action == RAISE:
             self._checkrep()
-            return action, 10
-        elif action == 'All-in':
+            return 'Raise', min(amount, self.bal)
+        elif action == ALL_IN:
             self.all_in()
             self._checkrep()
             return 'Raise', self.bal
         self._checkrep()
-        return action, 0
+        return ACTIONS[action], 0
 
     def clear_hand(self):
         self.hand = Hand()
@@ -245,6 +391,19 @@ class Player():
         return str(self)
 
 
+def _as_card(card):
+    """Returns `card` as a Card, decoding it first if it is an integer code."""
+    if isinstance(card, int):
+        return Card.from_int(card)
+    assert isinstance(card, Card)
+    return card
+
+
+def to_codes(cards):
+    """Integer card codes of `cards`, given as Card objects or codes."""
+    return [c.code if isinstance(c, Card) else c for c in cards]
+
+
 @total_ordering
 class Hand():
     """
@@ -263,8 +422,15 @@ class Hand():
             val = cards[i].val for 0 <= i <= len(cards)
             daa[i] = hand.count(val) for 0 <= i <= 13
 
+        codes
+            codes[i] = cards[i].code for 0 <= i < len(cards)
+
     Abstraction function:
         AF(suit, val) = Card of suit `suit` with value `val`
+
+    Cards may be given either as Card objects or as integer card codes. cards
+    and codes are tuples, so get_cards() and get_codes() hand them out
+    without copying.
     """
 
     checkers = {
@@ -281,43 +447,53 @@ class Hand():
     }
 
     def __init__(self, cards=None):
-        self.cards = [] if cards is None else cards
+        cards = () if cards is None else cards
+        self.cards = tuple(_as_card(c) for c in cards)
+        self.codes = tuple(c.code for c in self.cards)
         self.daa = [0] * 13
-        for c in self.cards:
-            val = c.get_val()
-            i = VALS_MAPPING[val] - 2
-            self.daa[i] += 1
+        for code in self.codes:
+            self.daa[code >> 2] += 1
+        self._rank = None
         self._checkrep()
 
+    def copy(self):
+        """Returns an independent Hand with the same cards; the immutable
+        card tuples are shared rather than copied."""
+        hand = Hand.__new__(Hand)
+        hand.cards, hand.codes, hand.daa = self.cards, self.codes, self.daa[:]
+        hand._rank = self._rank
+        return hand
+
+    @checkrep_policy
     def _checkrep(self):
         assert len(self.cards) <= CARDS_IN_A_HAND
 
-        vals_list = []
+        vals_count = [0] * 13
         for card in self.cards:
             assert isinstance(card, Card)
-            val = card.get_val()
-            vals_list.append(VALS_MAPPING[val] - 2)
-        assert len(set(self.cards)) == len(self.cards)
+            vals_count[VALS_MAPPING[card.val] - 2] += 1
+        assert len(set(self.codes)) == len(self.codes)
+        assert self.codes == tuple(card.code for card in self.cards)
 
         assert len(self.daa) == 13
         assert sum(self.daa) <= 5
-        for i in range(len(self.daa)):
-            assert self.daa[i] <= 4
-            assert self.daa[i] == vals_list.count(i)
+        assert max(self.daa) <= 4
+        assert self.daa == vals_count
 
     def get_cards(self):
-        cards_list = []
-        for card in self.cards:
-            cards_list.append(Card(card.get_suit(), card.get_val()))
         self._checkrep()
-        return cards_list
+        return self.cards
+
+    def get_codes(self):
+        self._checkrep()
+        return self.codes
 
     def add_card(self, card):
-        assert isinstance(card, Card)
-        self.cards += [card]
-        val = card.get_val()
-        i = VALS_MAPPING[val] - 2
-        self.daa[i] += 1
+        card = _as_card(card)
+        self.cards += (card, )
+        self.codes += (card.code, )
+        self.daa[card.code >> 2] += 1
+        self._rank = None
         self._checkrep()
 
     def check_royal_flush(self):
@@ -360,8 +536,29 @@ class Hand():
     def check_high_card(self):
         return True
 
+    def get_rank(self):
+        """Gets the evaluator rank of the hand; a lower rank is a better hand.
+        Two hands of equal strength have the same rank. The rank is computed
+        once and cached until the next add_card, so it is cheap to use as a
+        sort key, e.g. min(hands, key=Hand.get_rank) is the best hand."""
+        if self._rank is None:
+            self._rank = self._compute_rank()
+            self._checkrep()
+        return self._rank
+
+    def _compute_rank(self):
+        assert len(self.cards) == CARDS_IN_A_HAND
+        if _rank_cache is not None:
+            return _rank_cache.get_rank(self.codes)
+        return evaluate5(self.codes)
+
     def get_best_hand(self):
         """Gets the best type of poker hand associated with set of cards."""
+        return rank_category(self.get_rank())
+
+    def get_best_hand_by_checkers(self):
+        """Reference implementation of get_best_hand that walks the checkers
+        in HAND_RANKINGS order."""
         assert len(self.cards) == CARDS_IN_A_HAND
 
         for hand_check in HAND_RANKINGS:
@@ -399,24 +596,12 @@ class Hand():
     def __eq__(self, other):
         if not isinstance(other, Hand):
             raise TypeError("Improper comparison type")
-        best, score = self.get_best_hand(), self.get_sorted()
-        other_best, other_score = other.get_best_hand(), other.get_sorted()
-        self._checkrep()
-        return best == other_best and score == other_score
+        return self.get_rank() == other.get_rank()
 
     def __gt__(self, other):
         if not isinstance(other, Hand):
             raise TypeError("Improper comparison type")
-        hand_type, score = self.get_best_hand(), self.get_sorted()
-        other_type, other_score = other.get_best_hand(), other.get_sorted()
-        i = HAND_RANKINGS.index(hand_type)
-        other_i = HAND_RANKINGS.index(other_type)
-
-        if i == other_i:
-            self._checkrep()
-            return score > other_score
-        self._checkrep()
-        return i < other_i
+        return self.get_rank() < other.get_rank()
 
     def __str__(self):
         if len(self.cards) < CARDS_IN_A_HAND:
@@ -436,15 +621,230 @@ class Hand():
         return str(self)
 
     def __hash__(self):
-        cards_tup = tuple(self.cards)
+        # Hands of equal strength compare equal, so they must hash alike
+        self._checkrep()
+        if len(self.cards) < CARDS_IN_A_HAND:
+            return hash(self.codes)
+        return hash(self.get_rank())
+
+    def __len__(self):
+        return len(self.cards)
+
+
+class BitHand(Hand):
+    """
+    Drop-in replacement for Hand backed by bitmasks. Besides the card tuples
+    it keeps accumulators that add_card updates in O(1):
+        mask (int): 52-bit set of card codes
+        suit_masks (list): 13-bit rank mask of the cards of each suit
+        daa (list): rank counts, as in Hand
+        kind_masks (list): kind_masks[k] = 13-bit mask of ranks held at
+                           least k times, for 1 <= k <= 4
+
+    Flush, straight and n-of-a-kind checks are bit operations on these. A
+    BitHand may grow to 7 cards (2 hole cards + 5 on the table), in which
+    case get_rank() and get_best_hand() give its best 5-card hand, so an
+    evaluation can be carried from the flop to the turn and river. The
+    individual check_* methods and get_sorted() keep their 5-card meaning.
+
+    Rep invariant:
+        len(cards) <= 7
+        no duplicates in cards
+        codes, mask, suit_masks, daa and kind_masks agree with cards
+    """
+
+    def __init__(self, cards=None):
+        self.cards = ()
+        self.codes = ()
+        self.mask = 0
+        self.suit_masks = [0] * NUM_SUITS
+        self.daa = [0] * NUM_RANKS
+        self.kind_masks = [0] * (NUM_SUITS + 1)
+        for card in () if cards is None else cards:
+            self._add(_as_card(card))
+        self._rank = None
         self._checkrep()
-        return hash(cards_tup)
+
+    @checkrep_policy
+    def _checkrep(self):
+        assert len(self.cards) <= MAX_CARDS_IN_BITHAND
+        assert self.codes == tuple(card.code for card in self.cards)
+        assert self.mask == sum(1 << code for code in self.codes)
+        assert len(self.codes) == self.mask.bit_count()
+        daa = [0] * NUM_RANKS
+        suit_masks = [0] * NUM_SUITS
+        for code in self.codes:
+            daa[code >> 2] += 1
+            suit_masks[code & 3] |= 1 << (code >> 2)
+        assert self.daa == daa
+        assert self.suit_masks == suit_masks
+        for k in range(1, NUM_SUITS + 1):
+            assert self.kind_masks[k] == sum(1 << r for r in range(NUM_RANKS)
+                                             if daa[r] >= k)
+
+    def _add(self, card):
+        code = card.code
+        assert not self.mask >> code & 1, "Duplicate card in hand"
+        rank = code >> 2
+        self.cards += (card, )
+        self.codes += (code, )
+        self.mask |= 1 << code
+        self.suit_masks[code & 3] |= 1 << rank
+        self.daa[rank] += 1
+        self.kind_masks[self.daa[rank]] |= 1 << rank
+
+    def copy(self):
+        hand = BitHand.__new__(BitHand)
+        hand.cards, hand.codes, hand.mask = self.cards, self.codes, self.mask
+        hand.suit_masks = self.suit_masks[:]
+        hand.daa = self.daa[:]
+        hand.kind_masks = self.kind_masks[:]
+        hand._rank = self._rank
+        return hand
+
+    def add_card(self, card):
+        self._add(_as_card(card))
+        self._rank = None
+        self._checkrep()
+
+    def get_rank_mask(self):
+        return self.suit_masks[0] | self.suit_masks[1] | \
+            self.suit_masks[2] | self.suit_masks[3]
+
+    def check_royal_flush(self):
+        return any(m & ROYAL_MASK == ROYAL_MASK for m in self.suit_masks)
+
+    def check_straight_flush(self):
+        return any(STRAIGHT_BEST[m] for m in self.suit_masks)
+
+    def check_four_of_a_kind(self):
+        return self.kind_masks[4] != 0
+
+    def check_full_house(self):
+        trips = self.kind_masks[3] & ~self.kind_masks[4]
+        pairs = self.kind_masks[2] & ~self.kind_masks[3]
+        return trips.bit_count() == 1 and pairs.bit_count() == 1
+
+    def check_flush(self):
+        return any(m.bit_count() >= CARDS_IN_A_HAND for m in self.suit_masks)
+
+    def check_straight(self):
+        return STRAIGHT_BEST[self.get_rank_mask()] != 0
+
+    def check_three_of_a_kind(self):
+        return self.kind_masks[3] != 0 and self.kind_masks[4] == 0
+
+    def check_two_pair(self):
+        return self.kind_masks[3] == 0 and self.kind_masks[2].bit_count() == 2
+
+    def check_one_pair(self):
+        return self.kind_masks[3] == 0 and self.kind_masks[2].bit_count() == 1
+
+    def _compute_rank(self):
+        # Rank of the best 5-card hand among the (5 to 7) cards held
+        assert len(self.cards) >= CARDS_IN_A_HAND
+        if _rank_cache is not None:
+            return _rank_cache.get_rank(self.codes, self.mask)
+        return rank_from_state(self.suit_masks, self.daa)
+
+
+class GameStats():
+    """
+    Per-phase instrumentation of PokerGame.play_round, aggregated over all
+    rounds played since it was enabled (or last cleared).
+        rounds (int): rounds recorded
+        phase_times (dict): total wall time in seconds of each phase:
+            deal (hole cards and blinds), betting (betting loop and board
+            cards), showdown (get_winner and payouts), reset (reset_game)
+        betting_iterations (int): turns taken in betting loops
+        hand_evaluations (int): hands ranked at showdown
+        checkrep_calls (int): _checkrep calls made while playing rounds
+        last_round (dict): the same counters for the latest round alone
+
+    Rep invariant:
+        rounds >= 0
+        all times and counters >= 0
+    """
+
+    PHASES = ('deal', 'betting', 'showdown', 'reset')
+
+    def __init__(self):
+        self.clear()
+
+    @checkrep_policy
+    def _checkrep(self):
+        assert self.rounds >= 0
+        assert all(t >= 0 for t in self.phase_times.values())
+        assert self.betting_iterations >= 0
+        assert self.hand_evaluations >= 0
+        assert self.checkrep_calls >= 0
+
+    def clear(self):
+        self.rounds = 0
+        self.phase_times = {phase: 0.0 for phase in self.PHASES}
+        self.betting_iterations = 0
+        self.hand_evaluations = 0
+        self.checkrep_calls = 0
+        self.last_round = None
+
+    def record_round(self, times, betting_iterations, hand_evaluations,
+                     checkrep_calls):
+        """Adds one round; `times` is a sequence of per-phase durations in
+        PHASES order."""
+        self.rounds += 1
+        for phase, duration in zip(self.PHASES, times):
+            self.phase_times[phase] += duration
+        self.betting_iterations += betting_iterations
+        self.hand_evaluations += hand_evaluations
+        self.checkrep_calls += checkrep_calls
+        self.last_round = {'phase_times': dict(zip(self.PHASES, times)),
+                           'betting_iterations': betting_iterations,
+                           'hand_evaluations': hand_evaluations,
+                           'checkrep_calls': checkrep_calls}
+        self._checkrep()
+
+    def get_summary(self):
+        """Totals, per-round means and each phase's share of the time."""
+        n = max(self.rounds, 1)
+        total_time = sum(self.phase_times.values())
+        return {'rounds': self.rounds,
+                'total_time': total_time,
+                'phase_times': dict(self.phase_times),
+                'phase_share': {phase: t / total_time if total_time else 0.0
+                                for phase, t in self.phase_times.items()},
+                'mean_phase_times': {phase: t / n for phase, t in
+                                     self.phase_times.items()},
+                'betting_iterations': self.betting_iterations,
+                'hand_evaluations': self.hand_evaluations,
+                'checkrep_calls': self.checkrep_calls,
+                'mean_betting_iterations': self.betting_iterations / n,
+                'mean_hand_evaluations': self.hand_evaluations / n,
+                'mean_checkrep_calls': self.checkrep_calls / n}
+
+    def __str__(self):
+        summary = self.get_summary()
+        stats_str = f'{self.rounds} rounds, {summary["total_time"]:.4f}s'
+        for phase in self.PHASES:
+            stats_str += f'\n- {phase}: {self.phase_times[phase]:.4f}s ' + \
+                f'({summary["phase_share"][phase]:.1%})'
+        stats_str += '\n- betting iterations/round: ' + \
+            f'{summary["mean_betting_iterations"]:.1f}'
+        stats_str += '\n- hand evaluations/round: ' + \
+            f'{summary["mean_hand_evaluations"]:.1f}'
+        stats_str += '\n- checkrep calls/round: ' + \
+            f'{summary["mean_checkrep_calls"]:.1f}'
+        return stats_str
+
+    def __repr__(self):
+        return str(self)
 
 
 class PokerGame():
     """Represents a poker game (Texas Hold 'em). Args:
             players (list of Player objects): all participating players
             cost (float): cost to play
+            recorder (history.HandHistoryWriter): optional; every round's
+                actions, cards, pot and payouts are appended to it
 
     Poker game round progression:
         1. Deal out 2 cards to each player
@@ -467,12 +867,15 @@ class PokerGame():
         pot >= 0
         round_cost >= 0
         table has no duplicate cards
+        table is a tuple of integer card codes
         len(table) <= 3
         0 <= big_i < len(players)
         0 <= small_i < len(players)
 
         p in player_status for p in players
         player_status[p] in {'Active', 'Folded', 'Checked'}
+        num_in_hand == number of players 'Active' or 'Checked'
+        num_checked == number of players 'Checked'
 
     Abstraction function:
         AF(args) = Poker game with specs following args
@@ -488,7 +891,7 @@ class PokerGame():
                    player is awaiting next turn
     """
 
-    def __init__(self, players, cost):
+    def __init__(self, players, cost, recorder=None):
         assert len(players) > 2
 
         # Unchanging class attributes (game-level)
@@ -506,13 +909,20 @@ class PokerGame():
         self.round = 0                                     # Start on 0th round
         self.pot = 0                                       # Start $0 in pot
         self.round_cost = self.cost                        # Cost to play round
-        self.table = []                                    # Cards at play
+        self.table = ()                                    # Card codes at play
         self.small_i = self.round % len(self.players)      # 1st small
         self.big_i = (self.round + 1) % len(self.players)  # 1st big
         self.player_status = {}
         for player in players:
             self.player_status[player] = 'Active'
+        self.num_in_hand = len(players)             # 'Active' or 'Checked'
+        self.num_checked = 0                        # 'Checked'
+        self.positions = {}                         # Player -> position
 
+        self.stats = None                           # GameStats when enabled
+        self.recorder = recorder
+
+    @checkrep_policy
     def _checkrep(self):
         assert isinstance(self.round, int)
         assert isinstance(self.small_i, int)
@@ -522,12 +932,16 @@ class PokerGame():
         assert total_money == self.start_amount
         for p in self.players:
             assert isinstance(p, Player)
-            assert len(p.get_hand().get_cards()) <= 2
+            assert len(p.get_codes()) <= 2
             assert p in self.player_status
             assert self.player_status[p] in {'Active', 'Folded', 'Checked',
                                              'Inactive'}
+        statuses = list(self.player_status.values())
+        assert self.num_checked == statuses.count('Checked')
+        assert self.num_in_hand == self.num_checked + statuses.count('Active')
+        assert len(set(self.table)) == len(self.table)
         for c in self.table:
-            assert isinstance(c, Card)
+            assert isinstance(c, int) and 0 <= c < CARDS_IN_A_DECK
 
         assert len(self.players) >= MIN_NUM_PLAYERS
         assert len(self.players) <= MAX_NUM_PLAYERS
@@ -538,6 +952,15 @@ class PokerGame():
         assert self.big_i < len(self.players) and self.big_i >= 0
         assert self.small_i < len(self.players) and self.small_i >= 0
 
+    def enable_stats(self):
+        """Starts recording per-phase GameStats for every round played;
+        returns the stats object (also available as self.stats)."""
+        self.stats = GameStats()
+        return self.stats
+
+    def disable_stats(self):
+        self.stats = None
+
     def get_round_cost(self):
         self._checkrep()
         return self.round_cost
@@ -548,7 +971,11 @@ class PokerGame():
 
     def get_table(self):
         self._checkrep()
-        return self.table[:]
+        return tuple(CARDS[c] for c in self.table)
+
+    def get_table_codes(self):
+        self._checkrep()
+        return self.table
 
     def get_round(self):
         self._checkrep()
@@ -566,16 +993,19 @@ class PokerGame():
         self.pot = 0
         self.round += 1
         self.round_cost = self.cost
-        self.table = []
+        self.table = ()
+        self.num_in_hand, self.num_checked = 0, 0
         for p in self.players:
             self.player_status[p] = 'Active' if p.get_bal() > 0 else 'Inactive'
+            self.num_in_hand += self.player_status[p] == 'Active'
             p.disable_all_in()
             p.clear_hand()
+        self.positions = {}
         active = self.get_active_players()
         self.small_i = self.round % len(active)      # 1st small
         self.big_i = (self.round + 1) % len(active)  # 1st big
 
-        self.deck = Deck()
+        self.deck.reset()
         self.deck.shuffle()                         # Start with shuffled deck
         self._checkrep()
 
@@ -603,6 +1033,10 @@ class PokerGame():
         return active_players
 
     def deactivate_player(self, player):
+        status = self.player_status[player]
+        if status == 'Active' or status == 'Checked':
+            self.num_in_hand -= 1
+            self.num_checked -= status == 'Checked'
         self.player_status[player] = 'Folded'
         self._checkrep()
 
@@ -642,6 +1076,8 @@ class PokerGame():
                     pymt = self.round_cost
 
                 self.collect_payment(pymt, player)
+                if self.player_status[player] != 'Checked':
+                    self.num_checked += 1
                 self.player_status[player] = 'Checked'
 
             case 'Raise':
@@ -654,16 +1090,42 @@ class PokerGame():
                 else:
                     self.round_cost += amount
 
-                for other_player in self.get_active_players():
-                    self.player_status[other_player] = 'Active'
-                self.player_status[player] = 'Checked'
+                status = self.player_status
+                for other_player in status:
+                    if status[other_player] == 'Checked':
+                        status[other_player] = 'Active'
+                status[player] = 'Checked'
+                self.num_checked = 1
 
             case _:
                 raise ValueError("Unexpected player action")
 
+    def get_decision_state(self, player):
+        """Decision of `player`'s turn."""
+        position = self.positions.get(player)
+        if position is None:
+            dealt = [p for p in self.players
+                     if len(p.get_codes()) == STARTING_NUM_CARDS]
+            position = (dealt.index(player) - self.small_i) % len(dealt)
+        return Decision(player.get_codes(), self.table, self.pot,
+                        self.round_cost, player.get_bal(), position,
+                        self.num_in_hand, player.is_all_in())
+
+    def get_hand_rank(self, player):
+        '''
+        Evaluator rank (lower is better) of the best 5-card hand the player
+        can make from their 2 cards and the cards on the table, computed in
+        one pass over all 7 cards.
+        '''
+        codes = player.get_codes() + self.table
+        if _rank_cache is not None:
+            return _rank_cache.get_rank(codes)
+        return evaluate(codes)
+
     def get_best_hand(self, player):
         '''
-        Helper function used in self.get_winner()
+        Returns the best 5-card Hand the player can make from their 2 cards
+        and the 5 cards on the table.
         Max no. hands:
         - 5 cards out: 7 choose 5 = 21 combinations per player
             - 2 cards from player: 5 choose 3       = 10
@@ -672,26 +1134,10 @@ class PokerGame():
                                                    + ----
                                                       21 total
         '''
-        hands = []
-        table = self.get_table()
-        # Case 1: Hand contains both of player's cards
-        for i in range(len(table)):
-            for j in range(i + 1, len(table)):
-                cards = table[:i] + table[i + 1:j] + table[j + 1:]
-                cards += player.get_hand().get_cards()
-                hands.append(Hand(cards))
-
-        # Case 2: Hand contains 1 card from player
-        for incl_card in player.get_hand().get_cards():
-            for i in range(len(table)):
-                hand = Hand([incl_card] + table[:i] + table[i + 1:])
-                hands.append(hand)
-
-        assert len(hands) == 20
-
-        hands.sort(reverse=True)
-
-        return hands[0]
+        assert len(self.table) == MAX_CARDS_ON_TABLE
+        codes = player.get_codes() + self.table
+        rank = evaluate5 if _rank_cache is None else _rank_cache.get_rank
+        return Hand(min(combinations(codes, CARDS_IN_A_HAND), key=rank))
 
     def get_winner(self):
         '''
@@ -706,22 +1152,25 @@ class PokerGame():
 
         # Case 2: Multiple players left and table has 5 cards
         assert len(self.table) == MAX_CARDS_ON_TABLE
-        winner, best_hand = [], Hand(self.table)
-
-        for player in self.get_active_players():
-            player_best_hand = self.get_best_hand(player)
-            if len(winner) == 0:
-                if player_best_hand >= best_hand:
-                    winner.append(player)
-            elif player_best_hand > best_hand:
-                winner, best_hand = [player], player_best_hand
-            elif player_best_hand == best_hand:
+        winner, best_rank = [], None
+
+        for player in active:
+            rank = self.get_hand_rank(player)
+            if best_rank is None or rank < best_rank:
+                winner, best_rank = [player], rank
+            elif rank == best_rank:
                 winner.append(player)
 
         self._checkrep()
         return winner
 
     def play_round(self):
+        stats = self.stats
+        if stats is not None:
+            checkrep_calls = get_checkrep_calls()
+            t0 = time.perf_counter()
+            betting_iterations = 0
+
         # Ensure no players with bal 0 can play
         for player in self.players:
             if player.get_bal() == 0:
@@ -743,31 +1192,55 @@ class PokerGame():
         else:
             self.collect_payment(self.cost // 2, small_blind)
 
+        small_paid = self.pot
         if big_blind.get_bal() <= self.cost:
             big_blind.all_in()
             self.collect_payment(big_blind.get_bal(), big_blind)
         else:
             self.collect_payment(self.cost, big_blind)
 
-        # Set initial player index
-        playing_i = next_i(self.big_i, active)
+        recorder = self.recorder
+        if recorder is not None:
+            seat = self.players.index
+            recorder.record_action(self.round, seat(small_blind),
+                                   'Small blind', 0, small_paid)
+            recorder.record_action(self.round, seat(big_blind), 'Big blind',
+                                   0, self.pot - small_paid)
+
+        # Players still in the hand form a ring in seat order; together with
+        # num_in_hand and num_checked, each turn is O(1)
+        next_player = {p: active[next_i(i, active)]
+                       for i, p in enumerate(active)}
+        prev_player = {p: active[i - 1] for i, p in enumerate(active)}
+        self.positions = {p: (i - self.small_i) % len(active)
+                          for i, p in enumerate(active)}
+        status = self.player_status
+
+        # Set initial player
+        turn_player = active[next_i(self.big_i, active)]
+        if stats is not None:
+            t1 = time.perf_counter()
 
         # Loop over players until all but 1 fold
-        while len(self.get_active_players()) > 1:
+        while self.num_in_hand > 1:
+            if stats is not None:
+                betting_iterations += 1
 
             # If all players checked, draw 1 card and reactivate
-            if self.is_all_checked():
+            if self.num_checked == self.num_in_hand:
                 if len(self.table) == MAX_CARDS_ON_TABLE:
                     break
                 self.deck.draw(1)                       # Burn a card
-                self.table += self.deck.draw(1)
-                for player in self.get_all_checked():
-                    self.player_status[player] = 'Active'
+                self.table += tuple(self.deck.draw_codes(1))
+                player = turn_player
+                for i in range(self.num_in_hand):
+                    status[player] = 'Active'
+                    player = next_player[player]
+                self.num_checked = 0
                 self.round_cost = 0
 
             # Get action of the player whose turn it is
-            turn_player = self.get_active_players()[playing_i]
-            action, amount = turn_player.action()
+            action, amount = turn_player.action(self)
 
             blind = None
             if len(self.table) == 0:
@@ -776,16 +1249,34 @@ class PokerGame():
                 elif turn_player == big_blind:
                     blind = 'Big'
 
+            pot = self.pot
             self.execute_action(turn_player, action, amount, blind=blind)
+            if recorder is not None:
+                recorder.record_action(self.round, seat(turn_player), action,
+                                       len(self.table), self.pot - pot)
 
             # Get next player
-            playing_i = next_i(playing_i, self.get_active_players())
-
+            if status[turn_player] == 'Folded':
+                after = next_player[turn_player]
+                before = prev_player[turn_player]
+                next_player[before], prev_player[after] = after, before
+                # Turns go by index into the list of players in the hand,
+                # which shrinks on a fold, so the folder's successor is
+                # skipped
+                turn_player = next_player[after]
+            else:
+                turn_player = next_player[turn_player]
+
+        if stats is not None:
+            t2 = time.perf_counter()
+            num_in_hand = self.num_in_hand
+            hand_evaluations = num_in_hand if num_in_hand > 1 else 0
         winner = self.get_winner()
         if len(winner) == 0:
             winner += self.get_active_players()
 
         # Pay winner and reset game
+        pot = self.pot
         winnings = self.pot // len(winner)
         leftover = self.pot % len(winner)
         [self.pay_player(winnings, p) for p in winner]
@@ -793,8 +1284,25 @@ class PokerGame():
             rand_i = random.choice(range(len(winner)))
             leftover_winner = winner[rand_i]
             self.pay_player(leftover, leftover_winner)
+        if recorder is not None:
+            payouts = [0] * len(self.players)
+            for p in winner:
+                payouts[seat(p)] += winnings
+            if leftover > 0:
+                payouts[seat(leftover_winner)] += leftover
+            recorder.record_round(self.round,
+                                  [p.get_codes() for p in self.players],
+                                  self.table, pot, payouts,
+                                  seat(small_blind), seat(big_blind))
+        if stats is not None:
+            t3 = time.perf_counter()
         self.reset_game()
         self._checkrep()
+        if stats is not None:
+            t4 = time.perf_counter()
+            stats.record_round((t1 - t0, t2 - t1, t3 - t2, t4 - t3),
+                               betting_iterations, hand_evaluations,
+                               get_checkrep_calls() - checkrep_calls)
         return winner
 
     def iterate_game(self, num_rounds=None):
@@ -822,12 +1330,44 @@ class PokerGame():
                 winner.add(p)
         return winner
 
+    def stream_game(self, num_rounds=None, snapshot_every=1):
+        '''
+        Generator form of iterate_game: plays `num_rounds` rounds (or until
+        a single player has money left) and yields a snapshot dict every
+        `snapshot_every` rounds and after the last one:
+            round (int): rounds played by this game so far
+            balances (list): balance of each player, in self.players order
+            num_solvent (int): number of players with a nonzero balance
+            rounds_per_sec (float): throughput since the previous snapshot
+        Memory use is constant; stop iterating (or close()) to cancel.
+        '''
+        played, since_snapshot = 0, 0
+        last_time = time.perf_counter()
+        while True:
+            self.play_round()
+            played += 1
+            since_snapshot += 1
+            balances = [p.get_bal() for p in self.players]
+            num_solvent = sum(1 for bal in balances if bal > 0)
+            done = num_solvent == 1 if num_rounds is None else \
+                played == num_rounds
+
+            if done or since_snapshot == snapshot_every:
+                now = time.perf_counter()
+                yield {'round': self.round, 'balances': balances,
+                       'num_solvent': num_solvent,
+                       'rounds_per_sec': since_snapshot /
+                       max(now - last_time, 1e-9)}
+                since_snapshot, last_time = 0, now
+            if done:
+                return
+
     def __str__(self):
         game_str = f'=========Poker game========='
         game_str += f'\n- Round {self.round}'
         game_str += f'\n- Cost to play: {self.cost}'
         game_str += f'\n- Round cost: {self.round_cost}'
-        game_str += f'\n- Table: {self.table}'
+        game_str += f'\n- Table: {[CARDS[c] for c in self.table]}'
         game_str += f'\n- Pot: {self.pot}'
         game_str += f'\n- Big blind index: {self.big_i}'
         game_str += f'\n- Small blind index: {self.small_i}\nPlayer status:'